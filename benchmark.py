@@ -0,0 +1,130 @@
+import sys
+import json
+import time
+import resource
+import argparse
+from surface.data import find_recordings
+from surface.touch_surface import DummyTouchSurface, EndOfStream
+from surface.processing_options import add_processing_arguments, load_models, create_processor
+from surface.game_board import MovesDetector
+from surface.metrics import StageProfiler
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--data_path", type=str, default="data/dataset_pieces/test",
+                        help="Recording (directory with .npy files or session file) or directory that is searched "
+                             "for recordings.")
+
+    add_processing_arguments(parser)
+
+    parser.add_argument("--output", type=str,
+                        help="Report is also written to this JSON file.")
+
+    parser.add_argument("--min_fps", type=float,
+                        help="Fail (exit code 1) when throughput is below this many frames per second.")
+
+    parser.add_argument("--reference", type=str,
+                        help="JSON report of an earlier run, fail when throughput dropped by more than "
+                             "--max_regression compared to it.")
+
+    parser.add_argument("--max_regression", type=float, default=0.1,
+                        help="Allowed relative drop of throughput compared to --reference.")
+
+    return parser.parse_args()
+
+def run_recording(path, processor, moves_detector, profiler):
+    """
+    Replays the recording as fast as possible through processing and move detection. Returns number of timed
+    frames (warm-up frames are not timed), time spent on them and number of detected moves.
+    """
+    source = DummyTouchSurface(path, mode="max")
+    n_frames, n_moves, elapsed = 0, 0, 0.0
+
+    try:
+        while processor.is_warming_up:
+            processor.process(source.get_data())
+
+        while 1:
+            start = time.perf_counter()
+            profiler.start()
+            x = source.get_data()
+            profiler.lap("acquire")
+
+            _, _, (board_state, sun_state) = processor.process(x)
+            n_moves += len(moves_detector.detect_moves(board_state, sun_state))
+            profiler.lap("moves")
+            profiler.end_frame()
+
+            elapsed += time.perf_counter() - start
+            n_frames += 1
+    except EndOfStream:
+        pass
+
+    return n_frames, elapsed, n_moves
+
+def check_thresholds(args, report):
+    failures = []
+    if args.min_fps is not None and report["fps"] < args.min_fps:
+        failures.append(f"throughput {report['fps']:.2f} fps is below {args.min_fps:.2f} fps")
+
+    if args.reference is not None:
+        with open(args.reference) as f:
+            reference_fps = json.load(f)["fps"]
+        if report["fps"] < reference_fps*(1 - args.max_regression):
+            failures.append(f"throughput {report['fps']:.2f} fps regressed by more than "
+                            f"{args.max_regression*100:.0f} % from {reference_fps:.2f} fps")
+
+    return failures
+
+def main():
+    args = get_arguments()
+
+    recordings = sorted(find_recordings(args.data_path))
+    if len(recordings) == 0:
+        print(f"No recordings found in {args.data_path}!")
+        sys.exit(1)
+
+    pieces_model, sun_model = load_models(args)
+
+    # Percentiles are computed over the last 100000 frames, more than all test recordings together.
+    profiler = StageProfiler(window=100000)
+    n_frames, n_moves, elapsed = 0, 0, 0.0
+    for path in recordings:
+        # Every recording starts from an empty board, state is not carried over.
+        processor = create_processor(args, pieces_model, sun_model, profiler)
+        moves_detector = MovesDetector(pieces_model.classes)
+
+        n, t, m = run_recording(path, processor, moves_detector, profiler)
+        n_frames, elapsed, n_moves = n_frames + n, elapsed + t, n_moves + m
+
+    stages = profiler.summary(percentiles=(50, 95, 99))["stages"]
+    report = {
+        "data_path": args.data_path,
+        "n_recordings": len(recordings),
+        "n_frames": n_frames,
+        "n_moves": n_moves,
+        "elapsed": elapsed,
+        "fps": n_frames/elapsed if elapsed > 0 else 0.0,
+        "stages": stages,
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024,
+        "config": {"baseline": args.baseline, "roi": args.roi, "event_driven": args.event_driven,
+                   "refresh_interval": args.refresh_interval, "n_avg_baseline": args.n_avg_baseline,
+                   "classifier_backend": args.classifier_backend, "gate_model": args.gate_model_filepath,
+                   "commit_margin": args.commit_margin}
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_thresholds(args, report)
+    for failure in failures:
+        print(f"FAILED: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
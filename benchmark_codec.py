@@ -0,0 +1,52 @@
+import pickle
+import timeit
+import argparse
+from surface import codec
+from surface.game_board import PhotosynthesisGame
+from surface.game_types import *
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-n", "--n_iterations", type=int, default=20000,
+                        help="How many times each message is encoded and decoded.")
+
+    return parser.parse_args()
+
+def get_messages():
+    move = Move(Piece(PlayerType.autumn, PieceType.medium), MoveType.added, (2, 7))
+    override = Override(PlayerType.winter, PointType.score, -3)
+
+    return {
+        "Move": move,
+        "Override": override,
+        "GameStateSummary": GameStateSummary(12, 40, 9, 37, True, 18, 16, 13),
+        "command move": {"cmd": "move", "data": move},
+        "command override": {"cmd": "override", "data": override},
+        "command busy flag": {"cmd": "update_busy_flag", "data": True},
+        "command end game": {"cmd": "end_game"},
+        "board state": PhotosynthesisGame().gameboard_fields
+    }
+
+def measure(encode, decode, obj, n):
+    payload = encode(obj)
+    assert decode(payload) == obj
+
+    encode_time = timeit.timeit(lambda: encode(obj), number=n)/n
+    decode_time = timeit.timeit(lambda: decode(payload), number=n)/n
+
+    return encode_time, decode_time, len(payload)
+
+def main():
+    args = get_arguments()
+
+    pickle_encode = lambda obj: pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    print(f"{'message':<20}{'format':<8}{'encode [us]':>12}{'decode [us]':>12}{'size [B]':>10}")
+    for name, obj in get_messages().items():
+        for fmt, encode, decode in (("pickle", pickle_encode, pickle.loads), ("codec", codec.encode, codec.decode)):
+            encode_time, decode_time, size = measure(encode, decode, obj, args.n_iterations)
+            print(f"{name:<20}{fmt:<8}{encode_time*1e6:>12.2f}{decode_time*1e6:>12.2f}{size:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import timeit
+import argparse
+import numpy as np
+from surface.data import load_samples
+from surface.misc import align
+from surface.baseline import NaiveBaseline
+from surface.game_board import PHOTOSYNTHESIS_FIELDS, crop_images_from_fields
+from surface.field_sampler import PaddedFieldCropper
+from surface.processing import check_if_good_signal, filter_preds, gate_predictions
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--data_path", type=str, default="data/dataset_pieces/test/autumn/large/1-0",
+                        help="Recording used as input of the gating stage.")
+
+    parser.add_argument("--n_avg_baseline", type=int, default=5,
+                        help="Baseline is average of this many samples.")
+
+    parser.add_argument("-n", "--n_iterations", type=int, default=20,
+                        help="How many times the whole recording is processed.")
+
+    return parser.parse_args()
+
+# Per field implementations used before the gating stage was vectorized, kept as the reference.
+def check_if_good_signal_loop(imgs, min_n_pixel_active_threshold=0.06, pixel_active_threshold=5,
+                              min_n_active_pixel_negative_threshold=0.3):
+    is_good = []
+    for img in imgs:
+        img_flat = img.flatten()
+        activation = np.abs(img_flat)
+        n_above_threshold = (activation > pixel_active_threshold).sum()
+        n_negative_active = ((img_flat < 0) & (activation > pixel_active_threshold)).sum()
+
+        good_above_threshold = n_above_threshold > (len(img_flat)*min_n_pixel_active_threshold)
+        good_negative_above_threshold = n_negative_active > (n_above_threshold*min_n_active_pixel_negative_threshold)
+
+        is_good.append(good_above_threshold and good_negative_above_threshold)
+
+    return is_good
+
+def filter_preds_loop(preds, is_good, idx_empty):
+    preds_filtered = []
+    for good, pred in zip(is_good, preds):
+        if good:
+            preds_filtered.append(pred)
+        else:
+            preds_filtered.append(idx_empty)
+
+    return preds_filtered
+
+def gate_predictions_loop(preds, state, trigger):
+    new_state = []
+    for trig, pred, st in zip(trigger, preds, state):
+        if (trig - 1) == 0:
+            new_state.append(pred)
+        else:
+            new_state.append(st)
+
+    return new_state
+
+def gating_loop(c_diff, preds, state, trigger, idx_empty):
+    for i in range(len(trigger)):
+        if trigger[i] > 0:
+            trigger[i] -= 1
+
+    is_good = check_if_good_signal_loop(crop_images_from_fields(PHOTOSYNTHESIS_FIELDS, c_diff))
+    preds = filter_preds_loop(preds, is_good, idx_empty)
+    return gate_predictions_loop(preds, state, trigger)
+
+def gating_vectorized(c_diff, preds, state, trigger, idx_empty, cropper, buf):
+    np.subtract(trigger, 1, out=trigger, where=trigger > 0)
+
+    is_good = check_if_good_signal(cropper(c_diff, buf), cropper.n_pixels)
+    preds = filter_preds(preds, is_good, idx_empty)
+    return gate_predictions(preds, state, trigger)
+
+def get_inputs(args):
+    baseline_processor = NaiveBaseline(args.n_avg_baseline)
+    frames = [baseline_processor(align(x, -1)) for x in load_samples(args.data_path)][args.n_avg_baseline:]
+
+    # Predictions and triggers are random, the gating stage does the same work for any values.
+    rng = np.random.default_rng(0)
+    n_fields = len(PHOTOSYNTHESIS_FIELDS)
+    preds = [rng.integers(0, 9, n_fields).astype(np.uint8) for _ in frames]
+    state = rng.integers(0, 9, n_fields).astype(np.uint8)
+    triggers = [rng.integers(0, 5, n_fields) for _ in frames]
+
+    return frames, preds, state, triggers
+
+def main():
+    args = get_arguments()
+
+    frames, preds, state, triggers = get_inputs(args)
+    cropper = PaddedFieldCropper(PHOTOSYNTHESIS_FIELDS)
+    buf = np.zeros(cropper.shape, dtype=np.float32)
+    idx_empty = 8
+
+    for x, p, t in zip(frames, preds, triggers):
+        t_loop, t_vectorized = t.copy(), t.copy()
+        out_loop = gating_loop(x, p, state, t_loop, idx_empty)
+        out_vectorized = gating_vectorized(x, p, state, t_vectorized, idx_empty, cropper, buf)
+        assert np.array_equal(out_loop, out_vectorized) and np.array_equal(t_loop, t_vectorized)
+
+    def run(fn, *extra):
+        for x, p, t in zip(frames, preds, triggers):
+            fn(x, p, state, t.copy(), idx_empty, *extra)
+
+    n_frames = len(frames)*args.n_iterations
+    loop_time = timeit.timeit(lambda: run(gating_loop), number=args.n_iterations)/n_frames
+    vectorized_time = timeit.timeit(lambda: run(gating_vectorized, cropper, buf), number=args.n_iterations)/n_frames
+
+    print(f"Gating stage of {len(PHOTOSYNTHESIS_FIELDS)} fields, {n_frames} frames, outputs are identical.")
+    print(f"{'implementation':<16}{'per frame [us]':>16}")
+    print(f"{'loop':<16}{loop_time*1e6:>16.1f}")
+    print(f"{'vectorized':<16}{vectorized_time*1e6:>16.1f}")
+    print(f"speedup: {loop_time/vectorized_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
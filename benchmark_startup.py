@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+import numpy as np
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--pieces_model_filepath", type=str, default="models/pieces_model",
+                        help="Path to the directory that stores model for pieces classification (with model.npz).")
+
+    parser.add_argument("--sun_model_filepath", type=str, default="models/sun_model",
+                        help="Path to the directory that stores model for sun classification (with model.npz).")
+
+    parser.add_argument("-n", "--n_runs", type=int, default=5,
+                        help="How many times every variant is started, median time is reported.")
+
+    return parser.parse_args()
+
+def get_variants(pieces_path, sun_path):
+    """
+    Code that every script runs before it starts processing: imports and model loading.
+    """
+    models = f"PiecesClassifier({pieces_path!r}, {{backend!r}}); PiecesClassifier({sun_path!r}, {{backend!r}})"
+    data_processor = "import data_processor; from surface.pieces_classifier import PiecesClassifier; " + models
+
+    return {
+        "data_processor (joblib + sklearn)": data_processor.format(backend="sklearn"),
+        "data_processor (model.npz)": data_processor.format(backend="numpy"),
+        # move_finder used to load classes.bin with joblib directly.
+        "move_finder (classes.bin)": "import move_finder, joblib; "
+                                     f"joblib.load({os.path.join(pieces_path, 'classes.bin')!r})",
+        "move_finder (model.npz)": f"import move_finder; move_finder.load_classes({pieces_path!r})"
+    }
+
+def measure(code, n_runs):
+    """
+    Returns median wall time of a fresh interpreter running code and whether sklearn was imported.
+    """
+    code += "; import sys; print('sklearn' in sys.modules)"
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    times = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-W", "ignore", "-c", code], cwd=cwd, check=True,
+                             capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+
+    return np.median(times), out.stdout.strip().splitlines()[-1] == "True"
+
+def main():
+    args = get_arguments()
+
+    pieces_path = os.path.abspath(args.pieces_model_filepath)
+    sun_path = os.path.abspath(args.sun_model_filepath)
+
+    print(f"{'variant':<36}{'startup [s]':>12}{'sklearn':>10}")
+    for name, code in get_variants(pieces_path, sun_path).items():
+        startup_time, sklearn_imported = measure(code, args.n_runs)
+        print(f"{name:<36}{startup_time:>12.3f}{'yes' if sklearn_imported else 'no':>10}")
+
+if __name__ == "__main__":
+    main()
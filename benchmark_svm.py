@@ -0,0 +1,98 @@
+import sys
+import timeit
+import argparse
+import numpy as np
+from tqdm import tqdm
+from surface.data import load_samples, find_recordings
+from surface.misc import align
+from surface.baseline import NaiveBaseline
+from surface.field_sampler import FieldSampler
+from surface.game_board import PHOTOSYNTHESIS_FIELDS
+from surface.pieces_classifier import PiecesClassifier
+from surface.processing import N_SUN_FIELDS
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--data_path", type=str, default="data",
+                        help="Every field of every frame of recordings under this path is classified.")
+
+    parser.add_argument("--n_avg_baseline", type=int, default=5,
+                        help="Baseline is average of this many samples.")
+
+    parser.add_argument("--pieces_model_filepath", type=str, default="models/pieces_model",
+                        help="Path to the directory that stores model for pieces classification.")
+
+    parser.add_argument("--sun_model_filepath", type=str, default="models/sun_model",
+                        help="Path to the directory that stores model for sun classification.")
+
+    parser.add_argument("-n", "--n_timed_frames", type=int, default=200,
+                        help="How many frames are used to measure time per frame.")
+
+    return parser.parse_args()
+
+def get_field_images(recordings, n_avg_baseline, target_size):
+    """
+    Returns (n_frames, n_fields, height, width) images of all fields resized to target_size.
+    """
+    sampler = FieldSampler(PHOTOSYNTHESIS_FIELDS, target_size)
+
+    images = []
+    for path in tqdm(recordings):
+        baseline_processor = NaiveBaseline(n_avg_baseline)
+        frames = [baseline_processor(align(x, -1)) for x in load_samples(path)][n_avg_baseline:]
+        images += [sampler(x) for x in frames]
+
+    return np.array(images)
+
+def compare(name, models, images, batch_size=4096):
+    """
+    Classifies images with both backends, returns number of samples with different predictions.
+    """
+    n_different = 0
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        n_different += int((models[0].forward(batch) != models[1].forward(batch)).sum())
+    print(f"{name}: {len(images)} samples, {n_different} different predictions")
+
+    return n_different
+
+def main():
+    args = get_arguments()
+
+    sklearn_models = (PiecesClassifier(args.pieces_model_filepath, "sklearn"),
+                      PiecesClassifier(args.sun_model_filepath, "sklearn"))
+    numpy_models = (PiecesClassifier(args.pieces_model_filepath, "numpy"),
+                    PiecesClassifier(args.sun_model_filepath, "numpy"))
+
+    recordings = sorted(find_recordings(args.data_path))
+    images = get_field_images(recordings, args.n_avg_baseline, sklearn_models[0].target_img_size)
+    board_images = images[:, :-N_SUN_FIELDS]
+    sun_images = images[:, -N_SUN_FIELDS:]
+    print(f"{len(images)} frames from {len(recordings)} recordings.")
+
+    n_different = compare("pieces", (sklearn_models[0], numpy_models[0]), np.concatenate(board_images))
+    n_different += compare("sun", (sklearn_models[1], numpy_models[1]), np.concatenate(sun_images))
+
+    # Every frame is classified with one call per model, the same as in FrameProcessor.
+    def run(models, frames):
+        for board, sun in zip(board_images[frames], sun_images[frames]):
+            models[0].forward(board)
+            models[1].forward(sun)
+
+    frames = np.linspace(0, len(images) - 1, min(args.n_timed_frames, len(images))).astype(int)
+    sklearn_time = timeit.timeit(lambda: run(sklearn_models, frames), number=1)/len(frames)
+    numpy_time = timeit.timeit(lambda: run(numpy_models, frames), number=1)/len(frames)
+
+    print(f"Classification of {images.shape[1]} fields per frame, {len(frames)} frames.")
+    print(f"{'backend':<16}{'per frame [ms]':>16}")
+    print(f"{'sklearn':<16}{sklearn_time*1e3:>16.2f}")
+    print(f"{'numpy':<16}{numpy_time*1e3:>16.2f}")
+    print(f"speedup: {sklearn_time/numpy_time:.1f}x")
+
+    if n_different > 0:
+        print("Backends do not agree!")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import sys
+import argparse
+import tracemalloc
+import numpy as np
+from surface.data import load_samples
+from surface.misc import align
+from surface.baseline import NaiveBaseline, DriftTrackingBaseline
+from surface.processing import FramePreprocessor
+from surface.field_sampler import FieldROI
+from surface.game_board import PHOTOSYNTHESIS_FIELDS
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--data_path", type=str, default="data/dataset_pieces/test/autumn/large/1-0",
+                        help="Recording used as input.")
+
+    parser.add_argument("--n_avg_baseline", type=int, default=5,
+                        help="Baseline is average of this many samples.")
+
+    parser.add_argument("--baseline", type=str, default="naive", choices=["naive", "drift"])
+
+    parser.add_argument("--roi", action="store_true",
+                        help="Preprocess only pixels covered by the fields.")
+
+    return parser.parse_args()
+
+def get_baseline(args, shape):
+    if args.baseline == "drift":
+        baseline_processor = DriftTrackingBaseline(args.n_avg_baseline)
+        baseline_processor.set_exclusion_mask(np.zeros(shape, dtype=bool))
+        return baseline_processor
+
+    return NaiveBaseline(args.n_avg_baseline)
+
+def reference_preprocessing(baseline_processor):
+    # Preprocessing as it was done before FramePreprocessor.
+    state = {"c_diff_last": None}
+
+    def preprocess(x):
+        c_diff = baseline_processor(align(x, -1))
+        if state["c_diff_last"] is not None:
+            c_diff_dt = c_diff - state["c_diff_last"]
+        state["c_diff_last"] = c_diff.copy()
+
+    return preprocess
+
+def measure(fn, samples, n_skip):
+    """
+    Returns the largest amount of memory allocated on top of the already allocated memory during a single call
+    (peak of traced memory), ignoring the first n_skip calls.
+    """
+    tracemalloc.start()
+    peaks = []
+    for i, x in enumerate(samples):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        fn(x)
+        if i >= n_skip:
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return max(peaks)
+
+def main():
+    args = get_arguments()
+
+    samples = load_samples(args.data_path)
+    frame_nbytes = samples[0].nbytes
+
+    # Buffers are allocated during baseline estimation and during the first frames.
+    n_skip = args.n_avg_baseline + 2
+
+    reference_peak = measure(reference_preprocessing(get_baseline(args, samples[0].shape)), samples, n_skip)
+    roi = FieldROI(PHOTOSYNTHESIS_FIELDS) if args.roi else None
+    shape = samples[0].shape if roi is None else roi.size
+    peak = measure(FramePreprocessor(get_baseline(args, shape), roi=roi), samples, n_skip)
+
+    print(f"Largest allocation per frame (steady state, frame is {frame_nbytes} B):")
+    print(f"{'align + baseline + diff + copy':<32}{reference_peak:>10} B")
+    print(f"{'FramePreprocessor':<32}{peak:>10} B")
+
+    if peak >= frame_nbytes:
+        print("FramePreprocessor allocates frame sized arrays!")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import argparse
+import numpy as np
+from tqdm import tqdm
+from surface.data import list_samples, find_recordings
+from surface.session import SessionWriter, SessionReader, EXTENSION, is_session
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("input", type=str,
+                        help="Directory with .npy files written by recorder.py.")
+
+    parser.add_argument("output", type=str,
+                        help="Output session file (or output directory with --recursive).")
+
+    parser.add_argument("--recursive", action="store_true",
+                        help="Convert every directory with .npy files under input, directory structure is kept "
+                             "and other files (e.g. fields.json) are not copied.")
+
+    parser.add_argument("--chunk_size", type=int, default=256,
+                        help="How many frames are stored in one chunk.")
+
+    return parser.parse_args()
+
+def convert(input_dir, output_path, chunk_size):
+    # Numbering of the files may have gaps, frames and timestamps are read from the same list of files.
+    filepaths = list_samples(input_dir)
+    if len(filepaths) == 0:
+        return 0
+    samples = [np.load(p) for p in filepaths]
+
+    # Frames were saved as soon as they arrived, so file modification time is the best guess of capture time.
+    timestamps = [os.path.getmtime(p) for p in filepaths]
+
+    metadata = {"source": os.path.abspath(input_dir)}
+    with SessionWriter(output_path, samples[0].shape, samples[0].dtype, metadata, chunk_size) as writer:
+        for seq, (sample, timestamp) in enumerate(zip(samples, timestamps)):
+            writer.append(sample, seq=seq, timestamp=timestamp)
+
+    # Check that nothing was lost.
+    reader = SessionReader(output_path)
+    if len(reader) != len(samples) or not all(np.array_equal(a, b) for a, b in zip(reader, samples)):
+        raise RuntimeError(f"Conversion of {input_dir} failed!")
+
+    return len(samples)
+
+def main():
+    args = get_arguments()
+
+    if not args.recursive:
+        if os.path.exists(args.output):
+            print(f"{args.output} already exists!")
+            return
+        print(f"Converted {convert(args.input, args.output, args.chunk_size)} frames.")
+        return
+
+    n_frames = 0
+    recordings = sorted(path for path in find_recordings(args.input) if not is_session(path))
+    for recording in tqdm(recordings):
+        output_path = os.path.join(args.output, os.path.relpath(recording, args.input)) + EXTENSION
+        if os.path.exists(output_path):
+            print(f"{output_path} already exists, skipping.")
+            continue
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        n_frames += convert(recording, output_path, args.chunk_size)
+
+    print(f"Converted {n_frames} frames from {len(recordings)} directories.")
+
+if __name__ == "__main__":
+    main()
@@ -1,185 +1,193 @@
-import copy
+import zmq
+import time
 import argparse
-import numpy as np
 from surface.com import ZmqSubscriber, ZmqPublisher
-from surface.touch_surface import DummyTouchSurface
-from surface.baseline import NaiveBaseline
-from surface.misc import align
-from surface.game_board import PHOTOSYNTHESIS_FIELDS, crop_images_from_fields
-from surface.pieces_classifier import PiecesClassifier
-from surface.game_types import *
-from surface.game_board import VotingBoardStateEstimator
+from surface.touch_surface import DummyTouchSurface, EndOfStream
+from surface.shared_frames import SharedFrameReader
+from surface.processing import MultiTableProcessor
+from surface.processing_options import add_processing_arguments, load_models, create_processor
+from surface.tracing import get_trace
+from surface.metrics import StageProfiler, NULL_PROFILER
 
 def get_arguments():
     parser = argparse.ArgumentParser()
 
-    parser.add_argument("--input_address", type=str, default="tcp://localhost:5555",
-                        help="Address from which raw measurements are taken.")
+    parser.add_argument("--input_address", type=str, nargs="+", default=["tcp://localhost:5555"],
+                        help="Address from which raw measurements are taken, one per table.")
     
-    parser.add_argument("--input_channel", type=str, default="default",
-                        help="Channel from which input data will be taken.")
+    parser.add_argument("--input_channel", type=str, nargs="+", default=["default"],
+                        help="Channel from which input data will be taken, one per table or one for all tables.")
+
+    parser.add_argument("--shm_name", type=str, nargs="+",
+                        help="Read raw frames from shared memory written by measurement_server on this machine instead of zmq.")
+
+    parser.add_argument("--latest_only", action="store_true",
+                        help="Always process the newest frame and skip frames that queued up in the meantime.")
+
+    parser.add_argument("--hwm", type=int,
+                        help="Receive high water mark of the input socket (in messages).")
+
+    parser.add_argument("--poll_timeout", type=float, default=0.1,
+                        help="How long (in seconds) to wait for frames of zmq or shared memory inputs, tables without "
+                             "a new frame are skipped so that one stalled table does not block the others.")
 
     parser.add_argument("--output_address", type=str, default="tcp://*:5556",
                         help="Address on which the data products will be published.")
 
-    parser.add_argument("--dummy_data_path", type=str,
-                        help="If this is set we will read samples from recording.")
+    parser.add_argument("--dummy_data_path", type=str, nargs="+",
+                        help="If this is set we will read samples from recording (one per table).")
 
-    parser.add_argument("--n_avg_baseline", type=int, default=5,
-                        help="Baseline is average of this many samples.")
+    parser.add_argument("--table_ids", type=str, nargs="+",
+                        help="Ids of the tables, outputs are published on channels prefixed with table<id>/. "
+                             "Defaults to 0, 1, ... when there is more than one input and to no prefix otherwise.")
 
-    parser.add_argument("--pieces_model_filepath", type=str, default="models/pieces_model",
-                        help="Path to the directory that stores model for pieces classification.")
+    parser.add_argument("--replay_mode", type=str, default="fps", choices=DummyTouchSurface.MODES,
+                        help="How recording is replayed: at fixed --replay_fps, with the original timing sped up "
+                             "--replay_speed times or as fast as possible.")
 
-    parser.add_argument("--sun_model_filepath", type=str, default="models/sun_model",
-                        help="Path to the directory that stores model for sun classification.")
-    
-    return parser.parse_args()
+    parser.add_argument("--replay_fps", type=float, default=1.0,
+                        help="Frame rate of the replay in fps mode.")
 
-def check_if_good_signal(imgs, min_n_pixel_active_threshold=0.06, pixel_active_threshold=5,
-                         min_n_active_pixel_negative_threshold=0.3):
-    is_good = []
-    for img in imgs:
-        img_flat = img.flatten()
-        activation = np.abs(img_flat)
-        n_above_threshold = (activation > pixel_active_threshold).sum()
-        n_negative_active = ((img_flat < 0) & (activation > pixel_active_threshold)).sum()
+    parser.add_argument("--replay_speed", type=float, default=1.0,
+                        help="Speed up of the original timing in timed mode.")
 
-        good_above_threshold = n_above_threshold > (len(img_flat)*min_n_pixel_active_threshold)
-        good_negative_above_threshold = n_negative_active > (n_above_threshold*min_n_active_pixel_negative_threshold)
+    parser.add_argument("--loop", action="store_true",
+                        help="Start the recording from the beginning when it ends.")
 
-        is_good.append(good_above_threshold and good_negative_above_threshold)
-    
-    return is_good
-
-def filter_preds(preds, is_good, idx_empty):
-    preds_filtered = []
-    for good, pred in zip(is_good, preds):
-        if good:
-            preds_filtered.append(pred)
-        else:
-            preds_filtered.append(idx_empty)
-
-    return preds_filtered
-
-def find_trigger(img_dt, threshold=12.0, n_vote=4):
-    triggered = []
-    how_many_triggered = 0
-    for img in img_dt:
-        img = np.abs(img)
-        act = np.sum(img)/(img.shape[0] + img.shape[1])
-        if act > threshold:
-            triggered.append(n_vote)
-            how_many_triggered += 1
-        else:
-            triggered.append(0)
-
-    return np.array(triggered), how_many_triggered
-
-def gate_predictions(preds, state, trigger):
-    new_state = []
-    for trig, pred, st in zip(trigger, preds, state):
-        if (trig - 1) == 0:
-            new_state.append(pred)
-        else:
-            new_state.append(st)
-
-    return new_state
+    add_processing_arguments(parser)
 
-def main():
-    args = get_arguments()
+    parser.add_argument("--stats_interval", type=float, default=30.0,
+                        help="How often (in seconds) classification statistics are printed. 0 disables them.")
 
-    publisher = ZmqPublisher(args.output_address)
-    
-    if args.dummy_data_path:
-        subscriber = DummyTouchSurface(args.dummy_data_path)
-    else:
-        subscriber = ZmqSubscriber(args.input_address, args.input_channel)
-    
-    baseline_processor = NaiveBaseline(args.n_avg_baseline)
-    pieces_model = PiecesClassifier(args.pieces_model_filepath)
-    sun_model = PiecesClassifier(args.sun_model_filepath)
+    parser.add_argument("--metrics_interval", type=float, default=0.0,
+                        help="How often (in seconds) per stage timings are published on the metrics channel. "
+                             "0 switches timing off.")
 
-    for _ in range(args.n_avg_baseline):
-        x = subscriber.get_data()
-        x = align(x, -1)
-        c_diff_last = baseline_processor(x)
+    parser.add_argument("--metrics_window", type=int, default=500,
+                        help="Timing percentiles are computed over this many last frames.")
+
+    return parser.parse_args()
 
-    trigger = np.zeros(len(PHOTOSYNTHESIS_FIELDS), dtype=int)
+def create_sources(args):
+    if args.dummy_data_path:
+        return [DummyTouchSurface(path, args.replay_fps, args.replay_mode, args.replay_speed, args.loop)
+                for path in args.dummy_data_path]
+    if args.shm_name:
+        return [SharedFrameReader(name, args.latest_only) for name in args.shm_name]
+
+    n_tables = max(len(args.input_address), len(args.input_channel))
+    addresses = args.input_address*n_tables if len(args.input_address) == 1 else args.input_address
+    channels = args.input_channel*n_tables if len(args.input_channel) == 1 else args.input_channel
+    if len(addresses) != len(channels):
+        raise ValueError("Give one input channel for all tables or one for every input address!")
+
+    return [ZmqSubscriber(address, channel, args.latest_only, args.hwm) for address, channel in zip(addresses, channels)]
+
+def create_poller(subscribers):
+    if not isinstance(subscribers[0], ZmqSubscriber):
+        return None
+
+    poller = zmq.Poller()
+    for subscriber in subscribers:
+        poller.register(subscriber.socket, zmq.POLLIN)
+    return poller
+
+def receive_frames(subscribers, poller, timeout):
+    """
+    Returns a frame of every table with a frame ready within timeout and None for the other tables. Replays
+    are read in turn.
+    """
+    if poller is not None:
+        ready = dict(poller.poll(timeout*1000))
+        return [subscriber.get_data() if subscriber.socket in ready else None for subscriber in subscribers]
+
+    if isinstance(subscribers[0], SharedFrameReader):
+        deadline = time.monotonic() + timeout
+        while not any(subscriber.has_data() for subscriber in subscribers) and time.monotonic() < deadline:
+            time.sleep(subscribers[0].poll_interval)
+        return [subscriber.get_data() if subscriber.has_data() else None for subscriber in subscribers]
+
+    return [subscriber.get_data() for subscriber in subscribers]
+
+def get_channel_prefixes(args, n_tables):
+    if args.table_ids:
+        if len(args.table_ids) != n_tables:
+            raise ValueError(f"Got {len(args.table_ids)} table ids for {n_tables} inputs!")
+        return [f"table{table_id}/" for table_id in args.table_ids]
+
+    # Single table keeps the channel names used before multi-table support.
+    if n_tables == 1:
+        return [""]
+    return [f"table{i}/" for i in range(n_tables)]
+
+def print_stats(processors, prefixes):
+    for processor, prefix in zip(processors, prefixes):
+        print(f"{prefix}{processor.classification_stats}")
 
-    board_state = None
-    sun_state = None
+def main():
+    args = get_arguments()
 
-    state_estimator_board = VotingBoardStateEstimator(len(PHOTOSYNTHESIS_FIELDS) - 6)
-    state_estimator_sun = VotingBoardStateEstimator(6)
-    
-    for _ in range(5):
-        x = subscriber.get_data()
-        x = align(x, -1)
-        c_diff = baseline_processor(x)
-
-        field_images = crop_images_from_fields(PHOTOSYNTHESIS_FIELDS, c_diff)
-        c_diff_last = c_diff.copy()
-
-        preds_board = pieces_model.forward(field_images[:-6])
-        preds_sun = sun_model.forward(field_images[-6:])
-
-        is_good = check_if_good_signal(field_images)
-        preds_board = filter_preds(preds_board, is_good[:-6], len(pieces_model.classes)-1)
-        preds_sun = filter_preds(preds_sun, is_good[-6:], 0)
-
-        state_estimator_board.update_state(preds_board)
-        state_estimator_sun.update_state(preds_sun)
-
-    print("Processing pipeline started...")
-
-    while 1:
-        # Decrement trigger counter.
-        for i in range(len(trigger)):
-            if trigger[i] > 0:
-                trigger[i] -= 1
-        
-        x = subscriber.get_data()
-        x = align(x, -1)
-        c_diff = baseline_processor(x)
-        c_diff_dt = c_diff - c_diff_last
-
-        field_images = crop_images_from_fields(PHOTOSYNTHESIS_FIELDS, c_diff)
-        field_images_dt = crop_images_from_fields(PHOTOSYNTHESIS_FIELDS, c_diff_dt)
-        c_diff_last = c_diff.copy()
-
-        preds_board = pieces_model.forward(field_images[:-6])
-        preds_sun = sun_model.forward(field_images[-6:])
-
-        is_good = check_if_good_signal(field_images)
-        preds_board = filter_preds(preds_board, is_good[:-6], len(pieces_model.classes)-1)
-        preds_sun = filter_preds(preds_sun, is_good[-6:], 0)
-
-        state_estimator_board.update_state(preds_board)
-        state_estimator_sun.update_state(preds_sun)
-
-        preds_board = state_estimator_board.state_estimate
-        preds_sun = state_estimator_sun.state_estimate
-
-        if board_state is None:
-            board_state = copy.deepcopy(preds_board)
-            sun_state = copy.deepcopy(preds_sun)
-        
-        board_state = gate_predictions(preds_board, board_state, trigger[:-6])
-        sun_state = gate_predictions(preds_sun, sun_state, trigger[-6:])
-
-        publisher.send_data(c_diff, "c_diff")
-        publisher.send_data(field_images, "detected_images")
-        publisher.send_data((board_state, sun_state), "model_predictions")
-
-        new_trigger, how_many_triggered = find_trigger(field_images_dt)
-        if how_many_triggered > 3:
-            continue
-        
-        # Update trigger state.
-        for i in range(len(trigger)):
-            if new_trigger[i] > 0:
-                trigger[i] = new_trigger[i]
+    publisher = ZmqPublisher(args.output_address)
+    subscribers = create_sources(args)
+    prefixes = get_channel_prefixes(args, len(subscribers))
+
+    # Models are loaded once and shared by all tables.
+    pieces_model, sun_model = load_models(args)
+    profiler = StageProfiler(args.metrics_window) if args.metrics_interval > 0 else NULL_PROFILER
+    processors = [create_processor(args, pieces_model, sun_model, profiler) for _ in subscribers]
+    processor = MultiTableProcessor(processors, pieces_model, sun_model, profiler)
+
+    poller = create_poller(subscribers)
+
+    try:
+        is_started = False
+        last_stats_time = time.monotonic()
+        last_metrics_time = time.monotonic()
+        while 1:
+            if args.stats_interval > 0 and time.monotonic() - last_stats_time > args.stats_interval:
+                print_stats(processors, prefixes)
+                for table_processor in processors:
+                    table_processor.classification_stats.reset()
+                last_stats_time = time.monotonic()
+
+            if args.metrics_interval > 0 and time.monotonic() - last_metrics_time > args.metrics_interval:
+                publisher.send_data(profiler.summary(), "metrics")
+                last_metrics_time = time.monotonic()
+
+            profiler.start()
+            frames = receive_frames(subscribers, poller, args.poll_timeout)
+            # Polls that timed out for every table are not frames, the next start() discards their timing.
+            if all(x is None for x in frames):
+                continue
+            profiler.lap("acquire")
+            traces = [None if x is None else
+                      get_trace(subscriber, table_processor.n_frames).mark("data_processor/received")
+                      for subscriber, table_processor, x in zip(subscribers, processors, frames)]
+
+            outputs = processor.process(frames)
+
+            # Tables warm up separately, outputs of the tables that are ready are published in the meantime.
+            if not is_started and not processor.is_warming_up:
+                print(f"Processing pipeline started ({len(subscribers)} tables)...")
+                is_started = True
+
+            for out, trace, prefix in zip(outputs, traces, prefixes):
+                if out is None:
+                    continue
+
+                c_diff, field_images, predictions = out
+                trace.mark("data_processor/processed")
+                # Processor reuses c_diff buffers, zmq must not keep references to them.
+                publisher.send_data(c_diff, prefix + "c_diff", copy=True, trace=trace)
+                publisher.send_data(field_images, prefix + "detected_images", copy=True, trace=trace)
+                publisher.send_data(predictions, prefix + "model_predictions", trace=trace)
+            profiler.lap("publish")
+            profiler.end_frame()
+    except EndOfStream as e:
+        print(e)
+        print_stats(processors, prefixes)
+        if args.metrics_interval > 0:
+            print(profiler)
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,11 @@
 import argparse
 import threading
 from surface.com import ZmqSubscriber
+from surface.shared_frames import SharedFrameReader
 from surface.display import Display
 from surface.touch_surface import WIDTH, HEIGHT
+from surface.field_sampler import FieldROI
+from surface.game_board import PHOTOSYNTHESIS_FIELDS
 
 def get_arguments():
     parser = argparse.ArgumentParser()
@@ -13,6 +16,15 @@ def get_arguments():
     parser.add_argument("--channel", type=str, default="default",
                         help="Channel name.")
 
+    parser.add_argument("--shm_name", type=str,
+                        help="Read raw frames from shared memory written by measurement_server on this machine instead of zmq.")
+
+    parser.add_argument("--all_frames", action="store_true",
+                        help="Receive every frame instead of only the newest one.")
+
+    parser.add_argument("--hwm", type=int,
+                        help="Receive high water mark of the input socket (in messages).")
+
     parser.add_argument("--vmax", type=float, default=255,
                         help="Maximum value on colorbar.")
 
@@ -41,6 +53,7 @@ class DisplayWorker:
          self.display = display
          self.receiver = receiver
          self.data_idx = data_idx
+         self.roi = None
 
     def start(self):
         def wrapper():
@@ -51,7 +64,13 @@ class DisplayWorker:
                         data = data[self.data_idx]
                     else:
                         data = data[0]
-                
+
+                # Compacted frame from data_processor.py --roi.
+                if data.ndim == 1:
+                    if self.roi is None:
+                        self.roi = FieldROI(PHOTOSYNTHESIS_FIELDS)
+                    data = self.roi.expand(data)
+
                 self.display.frame = data
         self.thread = threading.Thread(target=wrapper)
         self.thread.start()
@@ -59,7 +78,10 @@ class DisplayWorker:
 def main():
     args = get_arguments()
 
-    rcv = ZmqSubscriber(args.address, args.channel)
+    if args.shm_name:
+        rcv = SharedFrameReader(args.shm_name, not args.all_frames)
+    else:
+        rcv = ZmqSubscriber(args.address, args.channel, not args.all_frames, args.hwm)
 
     display = Display(args.height, args.width, vmin=args.vmin, vmax=args.vmax, cmap=args.cmap, title=args.title)
     display_worker = DisplayWorker(display, rcv, args.idx)
@@ -0,0 +1,81 @@
+import os
+import timeit
+import argparse
+import numpy as np
+from surface.data import load_dataset, find_recordings
+from surface.game_board import PHOTOSYNTHESIS_FIELDS
+from surface.pieces_classifier import PiecesClassifier, CascadeClassifier, BACKENDS
+from surface.processing import N_SUN_FIELDS
+from benchmark_svm import get_field_images
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--dataset_path", type=str, default="data/dataset_pieces",
+                        help="Dataset with the test split in the test subdirectory.")
+
+    parser.add_argument("--n_baseline", type=int, default=5,
+                        help="Baseline is average of this many samples.")
+
+    parser.add_argument("--pieces_model_filepath", type=str, default="models/pieces_model",
+                        help="Path to the directory that stores model for pieces classification.")
+
+    parser.add_argument("--gate_model_filepath", type=str, default="models/gate_model",
+                        help="Path to the directory that stores empty vs occupied model (--binary_classifier).")
+
+    parser.add_argument("--classifier_backend", type=str, default="sklearn", choices=BACKENDS)
+
+    parser.add_argument("-n", "--n_timed_frames", type=int, default=200,
+                        help="How many frames of the test recordings are used to measure time per frame.")
+
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the sampling of negative samples of the test split.")
+
+    return parser.parse_args()
+
+def evaluate_accuracy(models, test_path, n_baseline):
+    classes, X, Y = load_dataset(test_path, PHOTOSYNTHESIS_FIELDS, n_baseline, models["single"].target_img_size)
+    labels = np.array(classes)[Y]
+
+    print(f"{len(X)} test samples.")
+    print(f"{'model':<10}{'accuracy':>10}{'occupied predicted empty':>28}")
+    for name, model in models.items():
+        preds = model.classes[model.forward(X)]
+        accuracy = (preds == labels).mean()
+        missed = ((preds == "empty") & (labels != "empty")).sum()
+        print(f"{name:<10}{accuracy:>10.4f}{missed:>28}")
+
+def evaluate_latency(models, test_path, n_baseline, n_timed_frames):
+    recordings = sorted(find_recordings(test_path))
+    images = get_field_images(recordings, n_baseline, models["single"].target_img_size)[:, :-N_SUN_FIELDS]
+    frames = images[np.linspace(0, len(images) - 1, min(n_timed_frames, len(images))).astype(int)]
+
+    print(f"Classification of {images.shape[1]} board fields per frame, {len(frames)} frames of the test recordings.")
+    cascade = models["cascade"]
+    n_images, n_passed = cascade.n_images, cascade.n_passed
+
+    print(f"{'model':<10}{'per frame [ms]':>16}")
+    for name, model in models.items():
+        t = timeit.timeit(lambda: [model.forward(x) for x in frames], number=1)/len(frames)
+        print(f"{name:<10}{t*1e3:>16.2f}")
+
+    passed = (cascade.n_passed - n_passed)/(cascade.n_images - n_images)
+    print(f"Gate passed {passed*100:.1f} % of the fields to the pieces model.")
+
+def main():
+    args = get_arguments()
+
+    pieces_model = PiecesClassifier(args.pieces_model_filepath, args.classifier_backend)
+    gate_model = PiecesClassifier(args.gate_model_filepath, args.classifier_backend)
+    models = {"single": pieces_model, "cascade": CascadeClassifier(gate_model, pieces_model)}
+
+    test_path = os.path.join(args.dataset_path, "test")
+
+    # Negative samples of the dataset are drawn at random.
+    np.random.seed(args.seed)
+    evaluate_accuracy(models, test_path, args.n_baseline)
+
+    evaluate_latency(models, test_path, args.n_baseline, args.n_timed_frames)
+
+if __name__ == "__main__":
+    main()
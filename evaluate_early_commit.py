@@ -0,0 +1,136 @@
+import os
+import argparse
+import numpy as np
+from tqdm import tqdm
+from surface.data import load_samples, load_json, find_recordings, list_directories
+from surface.game_board import MovesDetector, MoveType
+from surface.pieces_classifier import PiecesClassifier, BACKENDS
+from surface.processing import FrameProcessor
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--data_path", type=str, default="data/dataset_pieces",
+                        help="Pieces dataset, recordings are in <player>/<piece>/<level>-<angle> directories.")
+
+    parser.add_argument("--n_avg_baseline", type=int, default=5,
+                        help="Baseline is average of this many samples.")
+
+    parser.add_argument("--commit_margins", type=float, nargs="+", default=[0.5, 1.0, 1.5, 2.0],
+                        help="Margins evaluated against voting only.")
+
+    parser.add_argument("--pieces_model_filepath", type=str, default="models/pieces_model",
+                        help="Path to the directory that stores model for pieces classification.")
+
+    parser.add_argument("--sun_model_filepath", type=str, default="models/sun_model",
+                        help="Path to the directory that stores model for sun classification.")
+
+    parser.add_argument("--classifier_backend", type=str, default="numpy", choices=BACKENDS,
+                        help="Both backends give the same predictions, numpy is faster.")
+
+    return parser.parse_args()
+
+def get_placement(path):
+    """
+    Returns class name of the piece in the recording and (level, angle) positions of the fields it is placed on.
+    """
+    try:
+        positions = [(f["level"], f["angle"]) for f in load_json(os.path.join(path, "fields.json"))["pos_fields"]]
+    except FileNotFoundError:
+        level, angle = os.path.basename(path).split("-")
+        positions = [(int(level), int(angle))]
+
+    piece_path, _ = os.path.split(path)
+    player_path, piece = os.path.split(piece_path)
+    player = os.path.basename(player_path)
+
+    return f"{player} + {piece}", positions
+
+def create_move_sessions(recordings):
+    """
+    Recordings have a piece lying on a field from the start. Replaying a recording after another one with a piece
+    on different fields looks like a move: the first piece is taken away and the second one placed at the same
+    frame. Raw frames of an empty table are the same in all recordings, so the splice is not seen otherwise.
+    Returns list of (before, after) recording pairs.
+    """
+    placements = [get_placement(path) for path in recordings]
+
+    sessions = []
+    for i, (path, (_, positions)) in enumerate(zip(recordings, placements)):
+        for j in range(1, len(recordings)):
+            k = (i + j) % len(recordings)
+            if not set(positions) & set(placements[k][1]):
+                sessions.append((recordings[k], path))
+                break
+
+    return sessions
+
+def matches(move, move_types, piece_class, positions):
+    return move.move_type in move_types and tuple(move.coordinates) in positions and \
+           f"{move.piece.player.name} + {move.piece.piece_type.name}" == piece_class
+
+def run_session(before, after, pieces_model, sun_model, args, commit_margin):
+    """
+    Returns latency (in frames from the splice) of the detection of the removed and of the placed piece (None
+    if it was not detected) and number of wrong moves.
+    """
+    removed_class, removed_positions = get_placement(before)
+    placed_class, placed_positions = get_placement(after)
+    expected = [((MoveType["removed"], MoveType["bought_from_store"]), removed_class, removed_positions),
+                ((MoveType["added"], MoveType["returned_to_store"]), placed_class, placed_positions)]
+
+    before_samples = load_samples(before)
+    samples = before_samples + load_samples(after)
+
+    processor = FrameProcessor(pieces_model, sun_model, args.n_avg_baseline, commit_margin=commit_margin)
+    moves_detector = MovesDetector(pieces_model.classes)
+
+    latencies, n_wrong = [None, None], 0
+    for i, x in enumerate(samples):
+        out = processor.process(x)
+        if out is None:
+            continue
+
+        for move in moves_detector.detect_moves(*out[2]):
+            k = [j for j, e in enumerate(expected) if latencies[j] is None and matches(move, *e)]
+            if i >= len(before_samples) and len(k) > 0:
+                latencies[k[0]] = i - len(before_samples)
+            else:
+                n_wrong += 1
+
+    return latencies, n_wrong
+
+def main():
+    args = get_arguments()
+
+    pieces_model = PiecesClassifier(args.pieces_model_filepath, args.classifier_backend)
+    sun_model = PiecesClassifier(args.sun_model_filepath, args.classifier_backend)
+
+    modes = {"voting": None}
+    modes.update({f"margin {margin}": margin for margin in args.commit_margins})
+    results = {name: {"latency": [], "missed": 0, "wrong": 0} for name in modes}
+
+    # Moves are spliced only within a split, recordings of the same split were captured together.
+    sessions = []
+    for split_path in list_directories(args.data_path):
+        sessions += create_move_sessions(sorted(find_recordings(split_path)))
+
+    for before, after in tqdm(sessions):
+        for name, commit_margin in modes.items():
+            latencies, n_wrong = run_session(before, after, pieces_model, sun_model, args, commit_margin)
+            results[name]["latency"] += [latency for latency in latencies if latency is not None]
+            results[name]["missed"] += latencies.count(None)
+            results[name]["wrong"] += n_wrong
+
+    print(f"{len(sessions)} sessions, {2*len(sessions)} moves (piece removed and piece placed in every session).")
+    print(f"{'mode':<14}{'detected':>10}{'missed':>8}{'mean latency':>14}{'max latency':>13}{'wrong moves':>13}")
+    for name, result in results.items():
+        latency = np.array(result["latency"])
+        mean_latency = f"{latency.mean():.2f}" if len(latency) else "-"
+        max_latency = f"{latency.max()}" if len(latency) else "-"
+        print(f"{name:<14}{len(latency):>10}{result['missed']:>8}{mean_latency:>14}{max_latency:>13}"
+              f"{result['wrong']:>13}")
+    print("Latency is in frames from the first frame after the move.")
+
+if __name__ == "__main__":
+    main()
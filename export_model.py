@@ -0,0 +1,24 @@
+import os
+import argparse
+from surface.pieces_classifier import PiecesClassifier
+from surface.svm import ARTIFACT_NAME
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("model_paths", type=str, nargs="+",
+                        help="Directories with models saved by train_classifier.py (model.bin, scaler.bin, ...).")
+
+    return parser.parse_args()
+
+def main():
+    args = get_arguments()
+
+    for path in args.model_paths:
+        model = PiecesClassifier(path)
+        artifact_filepath = os.path.join(path, ARTIFACT_NAME)
+        model.save_artifact(artifact_filepath)
+        print(f"Saved {artifact_filepath} ({os.path.getsize(artifact_filepath)/1024:.0f} kB).")
+
+if __name__ == "__main__":
+    main()
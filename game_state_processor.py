@@ -1,13 +1,8 @@
-import os
 import time
 import argparse
 from surface.com import ZmqSubscriber, ZmqPublisher
-from surface.game_board import (
-    PhotosynthesisGame,
-    REWARDS_CENTER,
-    REWARDS_FERTILE,
-    REWARDS_EDGE
-)
+from surface.game_board import PhotosynthesisGame, summarize_game
+from surface.misc import create_move_log, log_move
 from surface.game_types import *
 
 def get_arguments():
@@ -26,6 +21,34 @@ def get_arguments():
     
     return parser.parse_args()
 
+def process_command(game, packet, is_busy, log_file):
+    """
+    Applies supervisor command to the game and returns the new value of the busy flag.
+    """
+    data = None
+    if packet["cmd"] == "move":
+        data = packet["data"]
+        game.apply_move(data)
+        log_move(log_file, data)
+
+    elif packet["cmd"] == "override":
+        data = packet["data"]
+        game.apply_point_override(data)
+    elif packet["cmd"] == "end_game":
+        game.end_game()
+        data = "Game ended"
+    elif packet["cmd"] == "update_busy_flag":
+        is_busy = packet["data"]
+        data = f"Is busy_updated to {is_busy}"
+
+    print(int(time.time()), data)
+
+    return is_busy
+
+def publish_game_state(publisher, game, is_busy, trace=None):
+    publisher.send_data(summarize_game(game, is_busy), "point_summary", trace=trace)
+    publisher.send_data(game.gameboard_fields, "board_state", trace=trace)
+
 def main():
     args = get_arguments()
 
@@ -33,41 +56,19 @@ def main():
     publisher_points = ZmqPublisher(args.output_address)
     game = PhotosynthesisGame()
 
-    if not os.path.exists(args.log_file):
-        with open(args.log_file, "w") as f:
-            f.write("time, move_type, piece_type, player, level, angle\n")
+    create_move_log(args.log_file)
 
     is_busy = False
 
     while 1:
         packet = subscriber_moves.get_data()
-        if packet["cmd"] == "move":
-            data = packet["data"]
-            game.apply_move(data)
-
-            with open(args.log_file, "a") as f:
-                move = data
-                f.write(f"{int(time.time())}, {move.move_type.name},{move.piece.piece_type.name},{move.piece.player.name},{move.coordinates[0]}, {move.coordinates[1]}\n")
-
-        elif packet["cmd"] == "override":
-            data = packet["data"]
-            game.apply_point_override(data)
-        elif packet["cmd"] == "end_game":
-            game.end_game()
-        elif packet["cmd"] == "update_busy_flag":
-            is_busy = packet["data"]
-            data = f"Is busy_updated to {is_busy}"
-
-        print(int(time.time()), data)
-        
-        publisher_points.send_data(GameStateSummary(game.winter_player.sun_points, game.winter_player.score,
-                                                game.autumn_player.sun_points, game.autumn_player.score,
-                                                is_busy,
-                                                REWARDS_CENTER[game.trees_cut_center_count],
-                                                REWARDS_FERTILE[game.trees_cut_fertile_count],
-                                                REWARDS_EDGE[game.trees_cut_edge_count]), "point_summary")
-        
-        publisher_points.send_data(game.gameboard_fields, "board_state")
+        trace = subscriber_moves.last_trace
+
+        is_busy = process_command(game, packet, is_busy, args.log_file)
+
+        if trace is not None:
+            trace.mark("game_state_processor")
+        publish_game_state(publisher_points, game, is_busy, trace)
 
 if __name__ == "__main__":
     main()
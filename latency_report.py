@@ -0,0 +1,118 @@
+import json
+import time
+import argparse
+import numpy as np
+import zmq
+from surface.com import ZmqSubscriber
+from surface.tracing import Trace, LatencyHistogram
+
+HISTOGRAM_EDGES_MS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, np.inf)
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--source", nargs=2, action="append", metavar=("ADDRESS", "CHANNEL"),
+                        help="Address and channel of traced messages, can be given multiple times. "
+                             "Defaults to the point summary published by game_state_processor.py.")
+
+    parser.add_argument("--recording", type=str,
+                        help="Create report from traces recorded with --record instead of a live run.")
+
+    parser.add_argument("--record", type=str,
+                        help="Save received traces into this file (one JSON object per line).")
+
+    parser.add_argument("--report_interval", type=float, default=30.0,
+                        help="How often (in seconds) the report is printed during a live run.")
+
+    parser.add_argument("-n", "--n_messages", type=int,
+                        help="Stop after receiving this many traced messages.")
+
+    return parser.parse_args()
+
+def print_report(histograms):
+    for channel, histogram in histograms.items():
+        print(f"== {channel} ==")
+        print(f"{'hop':<32}{'n':>6}{'p50 [ms]':>10}{'p95 [ms]':>10}{'p99 [ms]':>10}"
+              f"{'hop p50':>10}{'hop p95':>10}{'hop p99':>10}")
+
+        for name, (n, since_capture, since_previous) in histogram.summary().items():
+            row = "".join(f"{v*1e3:>10.1f}" for v in list(since_capture) + list(since_previous))
+            print(f"{name:<32}{n:>6}{row}")
+
+        # Histogram of the end to end latency (capture to the last hop).
+        last_hop = list(histogram.samples.keys())[-1]
+        counts, _ = np.histogram(np.array(histogram.samples[last_hop][0])*1e3, HISTOGRAM_EDGES_MS)
+        print(f"capture -> {last_hop}:")
+        for low, high, count in zip(HISTOGRAM_EDGES_MS[:-1], HISTOGRAM_EDGES_MS[1:], counts):
+            if count > 0:
+                print(f"  {low:>6}-{high:<6} ms {count:>6} {'#'*int(np.ceil(40*count/counts.max()))}")
+        print()
+
+def add_trace(histograms, channel, trace):
+    histograms.setdefault(channel, LatencyHistogram())
+    histograms[channel].add(trace)
+
+def load_recording(path):
+    histograms = {}
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            add_trace(histograms, entry["channel"], Trace.from_dict(entry["trace"]))
+
+    return histograms
+
+def run_live(args):
+    sources = args.source or [("tcp://localhost:5560", "point_summary")]
+    subscribers = [ZmqSubscriber(address, channel) for address, channel in sources]
+
+    poller = zmq.Poller()
+    for subscriber in subscribers:
+        poller.register(subscriber.socket, zmq.POLLIN)
+
+    record_file = open(args.record, "a") if args.record else None
+    histograms = {}
+    n_messages = 0
+    last_report_time = time.monotonic()
+
+    try:
+        while args.n_messages is None or n_messages < args.n_messages:
+            ready = dict(poller.poll(1000))
+            for (_, channel), subscriber in zip(sources, subscribers):
+                if subscriber.socket not in ready:
+                    continue
+
+                subscriber.get_data()
+                trace = subscriber.last_trace
+                if trace is None:
+                    continue
+
+                trace.mark("received")
+                add_trace(histograms, channel, trace)
+                n_messages += 1
+
+                if record_file is not None:
+                    record_file.write(json.dumps({"channel": channel, "trace": trace.to_dict()}) + "\n")
+
+            if time.monotonic() - last_report_time > args.report_interval and histograms:
+                print_report(histograms)
+                last_report_time = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if record_file is not None:
+            record_file.close()
+
+    return histograms
+
+def main():
+    args = get_arguments()
+
+    if args.recording:
+        histograms = load_recording(args.recording)
+    else:
+        histograms = run_live(args)
+
+    print_report(histograms)
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,124 @@
-from surface.touch_surface import TouchSurface
+import time
+import argparse
+import threading
+from surface.touch_surface import TouchSurface, WIDTH, HEIGHT
+from surface.ring_buffer import FrameRingBuffer
+from surface.shared_frames import SharedFrameWriter
 from surface.com import ZmqPublisher
+from surface.tracing import Trace
 
 ADDRESS = "tcp://*:5555"
 
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--output_address", type=str, default=ADDRESS,
+                        help="Address on which raw measurements are published.")
+
+    parser.add_argument("--ring_size", type=int, default=16,
+                        help="How many frames can wait between acquisition and publishing.")
+
+    parser.add_argument("--drop_policy", type=str, default="oldest", choices=["oldest", "newest"],
+                        help="Which frame is dropped when publisher can't keep up with acquisition.")
+
+    parser.add_argument("--shm_name", type=str,
+                        help="If set, frames are also written into shared memory with this name for local consumers.")
+
+    parser.add_argument("--shm_size", type=int, default=16,
+                        help="How many frames are kept in shared memory.")
+
+    parser.add_argument("--stats_interval", type=float, default=10.0,
+                        help="How often (in seconds) acquisition statistics are printed. 0 disables them.")
+
+    return parser.parse_args()
+
+class Worker:
+    """
+    Calls step() in a loop in its own thread. An exception ends the loop, it is kept in error and failed
+    event is set so that the main thread can stop the server.
+    """
+    def __init__(self, failed):
+        self.failed = failed
+        self.error = None
+
+    def step(self):
+        raise NotImplementedError
+
+    def start(self):
+        def wrapper():
+            try:
+                while 1:
+                    self.step()
+            except Exception as e:
+                self.error = e
+                self.failed.set()
+
+        self.thread = threading.Thread(target=wrapper, daemon=True)
+        self.thread.start()
+
+    def check(self):
+        if self.error is not None or not self.thread.is_alive():
+            raise RuntimeError(f"{type(self).__name__} stopped!") from self.error
+
+class AcquisitionWorker(Worker):
+    def __init__(self, surface, ring, failed, shared_frames=None):
+        super().__init__(failed)
+        self.surface = surface
+        self.ring = ring
+        self.shared_frames = shared_frames
+
+    def step(self):
+        data = self.surface.read_raw_values()
+        timestamp = time.time()
+        self.ring.put(data, timestamp)
+
+        if self.shared_frames is not None:
+            self.shared_frames.put(data, timestamp)
+
+class PublisherWorker(Worker):
+    def __init__(self, transmitter, ring, failed):
+        super().__init__(failed)
+        self.transmitter = transmitter
+        self.ring = ring
+        self.n_published = 0
+
+    def step(self):
+        frame = self.ring.get()
+        trace = Trace(frame.seq, frame.timestamp).mark("measurement_server")
+        self.transmitter.send_data(frame.data, seq=frame.seq, trace=trace)
+        self.n_published += 1
+
 def main():
-    transmitter = ZmqPublisher()
+    args = get_arguments()
+
+    transmitter = ZmqPublisher(args.output_address)
     surface = TouchSurface()
+    ring = FrameRingBuffer(args.ring_size, (HEIGHT, WIDTH), drop_oldest=args.drop_policy == "oldest")
+
+    shared_frames = SharedFrameWriter(args.shm_name, (HEIGHT, WIDTH), capacity=args.shm_size) if args.shm_name else None
+
+    failed = threading.Event()
+    acquisition_worker = AcquisitionWorker(surface, ring, failed, shared_frames)
+    publisher_worker = PublisherWorker(transmitter, ring, failed)
+
+    publisher_worker.start()
+    acquisition_worker.start()
     print("Measurement server started!")
 
-    while 1:
-        data = surface.read_raw_values()
-        transmitter.send_data(data)
+    try:
+        while 1:
+            # Failure of a worker (e.g. the surface was unplugged) ends the server with an error so that it can be
+            # restarted.
+            failed.wait(args.stats_interval if args.stats_interval > 0 else None)
+            acquisition_worker.check()
+            publisher_worker.check()
+
+            print(f"{surface.stats}, captured: {ring.n_pushed}, published: {publisher_worker.n_published}, "
+                  f"dropped: {ring.n_dropped}, queued: {len(ring)}")
+            surface.stats.reset()
+    finally:
+        if shared_frames is not None:
+            shared_frames.close()
 
 if __name__ == "__main__":
     main()
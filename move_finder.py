@@ -1,10 +1,8 @@
-import os
-import time
-import joblib
 import argparse
-import numpy as np
 from surface.com import ZmqSubscriber, ZmqPublisher
 from surface.game_board import MovesDetector
+from surface.misc import create_move_log, log_move
+from surface.pieces_classifier import load_classes
 
 def get_arguments():
     parser = argparse.ArgumentParser()
@@ -18,6 +16,9 @@ def get_arguments():
     parser.add_argument("--output_address", type=str, default="tcp://*:5558",
                         help="Address on which the data products will be published.")
 
+    parser.add_argument("--pieces_model_filepath", type=str, default="models/pieces_model",
+                        help="Path to the directory that stores model for pieces classification (only classes are used).")
+
     parser.add_argument("--log_file", type=str, default="log_move_finder.csv")
     
     return parser.parse_args()
@@ -32,22 +33,19 @@ def main():
     publisher = ZmqPublisher(args.output_address)
     subscriber_preds = ZmqSubscriber(args.input_address_preds, args.input_channel_preds)
 
-    classes = np.array(joblib.load("models/pieces_model/classes.bin"))
-    moves_detector = MovesDetector(classes)
+    moves_detector = MovesDetector(load_classes(args.pieces_model_filepath))
 
-    if not os.path.exists(args.log_file):
-        with open(args.log_file, "w") as f:
-            f.write("time, move_type, piece_type, player, level, angle\n")
+    create_move_log(args.log_file)
 
     print("Running")
     while 1:
         moves = run_move_detection_pipeline(subscriber_preds, moves_detector)
+        trace = subscriber_preds.last_trace
         for move in moves:
             print(f"Move: {move.move_type.name}, piece: {move.piece.piece_type.name}, player: {move.piece.player.name}, coordinates: {move.coordinates}")
-            publisher.send_data(move, "moves")
-        
-            with open(args.log_file, "a") as f:
-                f.write(f"{int(time.time())}, {move.move_type.name},{move.piece.piece_type.name},{move.piece.player.name},{move.coordinates[0]}, {move.coordinates[1]}\n")
+            move_trace = trace.copy().mark("move_finder") if trace is not None else None
+            publisher.send_data(move, "moves", trace=move_trace)
+            log_move(args.log_file, move)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,161 @@
+import copy
+import time
+import queue
+import argparse
+from surface.com import ZmqSubscriber, ZmqPublisher
+from surface.touch_surface import TouchSurface, DummyTouchSurface, EndOfStream
+from surface.processing_options import add_processing_arguments, load_models, create_processor
+from surface.game_board import MovesDetector, PhotosynthesisGame
+from surface.misc import create_move_log, log_move
+from surface.pipeline import Stage, Pipeline, END_OF_STREAM
+from surface.tracing import Trace
+from game_state_processor import process_command, publish_game_state
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--dummy_data_path", type=str,
+                        help="If this is set we will read samples from recording instead of the surface.")
+
+    parser.add_argument("--replay_mode", type=str, default="fps", choices=DummyTouchSurface.MODES,
+                        help="How recording is replayed: at fixed --replay_fps, with the original timing sped up "
+                             "--replay_speed times or as fast as possible.")
+
+    parser.add_argument("--replay_fps", type=float, default=1.0,
+                        help="Frame rate of the replay in fps mode.")
+
+    parser.add_argument("--replay_speed", type=float, default=1.0,
+                        help="Speed up of the original timing in timed mode.")
+
+    parser.add_argument("--loop", action="store_true",
+                        help="Start the recording from the beginning when it ends.")
+
+    add_processing_arguments(parser)
+
+    parser.add_argument("--queue_size", type=int, default=4,
+                        help="Capacity of the queues between the stages.")
+
+    parser.add_argument("--debug_address", type=str,
+                        help="If set, c_diff, detected images and model predictions are published on this address.")
+
+    parser.add_argument("--moves_address", type=str, default="tcp://*:5558",
+                        help="Address on which detected moves are published for the system supervisor.")
+
+    parser.add_argument("--supervisor_address", type=str, default="tcp://localhost:5559",
+                        help="Address from which supervisor commands are taken.")
+
+    parser.add_argument("--points_address", type=str, default="tcp://*:5560",
+                        help="Address on which the game state is published.")
+
+    parser.add_argument("--auto_accept", action="store_true",
+                        help="Apply detected moves directly to the game instead of waiting for the supervisor.")
+
+    parser.add_argument("--log_file_moves", type=str, default="log_move_finder.csv")
+
+    parser.add_argument("--log_file_game", type=str, default="log_game_state_processor.csv")
+
+    parser.add_argument("--status_interval", type=float, default=10.0,
+                        help="How often (in seconds) stage counters are printed.")
+
+    return parser.parse_args()
+
+def main():
+    args = get_arguments()
+
+    # Frames of the surface (and of replays that follow some timing) are dropped when processing can't keep up,
+    # unthrottled replay waits for processing instead.
+    drop_frames = True
+    if args.dummy_data_path:
+        source = DummyTouchSurface(args.dummy_data_path, args.replay_fps, args.replay_mode,
+                                   args.replay_speed, args.loop)
+        read_frame = source.get_data
+        drop_frames = args.replay_mode != "max"
+    else:
+        source = TouchSurface()
+        read_frame = lambda: source.read_raw_values().copy()
+
+    pieces_model, sun_model = load_models(args)
+    processor = create_processor(args, pieces_model, sun_model)
+
+    moves_detector = MovesDetector(pieces_model.classes)
+
+    game = PhotosynthesisGame()
+    state = {"is_busy": False, "n_frames": 0}
+
+    debug_publisher = ZmqPublisher(args.debug_address) if args.debug_address else None
+    moves_publisher = ZmqPublisher(args.moves_address)
+    points_publisher = ZmqPublisher(args.points_address)
+
+    create_move_log(args.log_file_moves)
+    create_move_log(args.log_file_game)
+
+    frames = queue.Queue(args.queue_size)
+    predictions = queue.Queue(args.queue_size)
+    commands = queue.Queue()
+
+    def acquire():
+        try:
+            x = read_frame()
+        except EndOfStream as e:
+            print(e)
+            return END_OF_STREAM
+
+        state["n_frames"] += 1
+        return x, Trace(state["n_frames"], time.time())
+
+    def process(item):
+        x, trace = item
+        out = processor.process(x)
+        if out is None:
+            return None
+
+        c_diff, field_images, preds = out
+        trace.mark("processing")
+
+        if debug_publisher is not None:
+            debug_publisher.send_data(c_diff, "c_diff", copy=True, trace=trace)
+            debug_publisher.send_data(field_images, "detected_images", copy=True, trace=trace)
+            debug_publisher.send_data(preds, "model_predictions", trace=trace)
+
+        return preds, trace
+
+    def detect_moves(item):
+        (preds_board, preds_sun), trace = item
+        for move in moves_detector.detect_moves(preds_board, preds_sun):
+            print(f"Move: {move.move_type.name}, piece: {move.piece.piece_type.name}, player: {move.piece.player.name}, coordinates: {move.coordinates}")
+            log_move(args.log_file_moves, move)
+            move_trace = trace.copy().mark("move_detection")
+
+            if args.auto_accept:
+                # Moves detector reuses piece objects, the game needs its own copy.
+                commands.put(({"cmd": "move", "data": copy.deepcopy(move)}, move_trace))
+            else:
+                moves_publisher.send_data(move, "moves", trace=move_trace)
+
+    def run_game(item):
+        packet, trace = item
+        state["is_busy"] = process_command(game, packet, state["is_busy"], args.log_file_game)
+
+        if trace is not None:
+            trace.mark("game")
+        publish_game_state(points_publisher, game, state["is_busy"], trace)
+
+    stages = [
+        Stage("acquisition", acquire, output_queue=frames, drop_oldest=drop_frames),
+        Stage("processing", process, frames, predictions),
+        # Moves are put into commands by detect_moves, the stage only passes END_OF_STREAM to the game.
+        Stage("move_detection", detect_moves, predictions, commands),
+        Stage("game", run_game, commands)
+    ]
+
+    if not args.auto_accept:
+        supervisor = ZmqSubscriber(args.supervisor_address, "commands")
+        receive_command = lambda: (supervisor.get_data(), supervisor.last_trace)
+        stages.append(Stage("supervisor", receive_command, output_queue=commands))
+
+    pipeline = Pipeline(stages)
+    print("Pipeline started...")
+    pipeline.run(args.status_interval, lambda: processor.classification_stats)
+
+if __name__ == "__main__":
+    main()
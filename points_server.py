@@ -1,9 +1,9 @@
 import threading
-import zmq
 import argparse
 from flask import Flask, request, render_template
 from dataclasses import dataclass
 from surface.game_types import GameStateSummary
+from surface.com import ZmqSubscriber
 
 def get_arguments():
     parser = argparse.ArgumentParser()
@@ -18,16 +18,11 @@ def get_arguments():
 
 class TelemetryReceiver:
     def __init__(self, address, input_channel):
-        context = zmq.Context()
-        self.socket = context.socket(zmq.SUB)
-        self.socket.connect(address)
-        self.socket.subscribe(input_channel)
+        self.subscriber = ZmqSubscriber(address, input_channel)
         self.game_state_summary = GameStateSummary()
 
     def _process_data(self):
-        topic = self.socket.recv_string()
-        value = self.socket.recv_pyobj()
-        self.game_state_summary = value
+        self.game_state_summary = self.subscriber.get_data()
 
     def start(self):
         def wrapper():
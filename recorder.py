@@ -2,13 +2,16 @@ import os
 import argparse
 import numpy as np
 from surface.com import ZmqSubscriber
+from surface.shared_frames import SharedFrameReader
+from surface.session import SessionWriter
+from surface.tracing import get_trace
 from tqdm import tqdm
 
 def get_arguments():
     parser = argparse.ArgumentParser()
 
     parser.add_argument("outdir", type=str,
-                        help="Path to folder that will contain all directories.")
+                        help="Path to folder that will contain all directories (or session file with --session).")
 
     parser.add_argument("--address", type=str, default="tcp://localhost:5555",
                         help="Address of the data.")
@@ -16,23 +19,73 @@ def get_arguments():
     parser.add_argument("--channel", type=str, default="default",
                         help="Channel name.")
 
+    parser.add_argument("--shm_name", type=str,
+                        help="Read raw frames from shared memory written by measurement_server on this machine instead of zmq.")
+
     parser.add_argument("--interactive", action="store_true",
                         help="Interactive mode, used for capture of datasets.")
 
+    parser.add_argument("--session", action="store_true",
+                        help="Append frames to a single session file instead of writing one .npy file per frame.")
+
+    parser.add_argument("--chunk_size", type=int, default=256,
+                        help="How many frames are written to the session file at once.")
+
     parser.add_argument("-n", "--n_sample", type=int, default=1,
                         help="How many samples to take in interactive mode.")
 
     return parser.parse_args()
 
-def main():
-    args = get_arguments()
+def get_receiver(args, latest_only=False):
+    if args.shm_name:
+        return SharedFrameReader(args.shm_name, latest_only)
+
+    return ZmqSubscriber(args.address, args.channel, latest_only)
+
+class DirectoryOutput:
+    def __init__(self, outdir):
+        if os.path.exists(outdir):
+            print(f"{outdir} alread exists!")
+
+        os.makedirs(outdir)
+        self.outdir = outdir
+
+    def save(self, idx, data, rcv):
+        np.save(os.path.join(self.outdir, f"{idx}.npy"), data)
 
-    if os.path.exists(args.outdir):
-        print(f"{args.outdir} alread exists!")
+    def flush(self):
+        pass
 
-    os.makedirs(args.outdir)
+    def close(self):
+        pass
 
+class SessionOutput:
+    def __init__(self, path, args):
+        self.path = path
+        self.metadata = {"address": args.address, "channel": args.channel, "shm_name": args.shm_name}
+        self.chunk_size = args.chunk_size
+        self.writer = None
+
+    def save(self, idx, data, rcv):
+        # Shape and type of frames are known only after the first frame arrives.
+        if self.writer is None:
+            self.writer = SessionWriter(self.path, data.shape, data.dtype, self.metadata, self.chunk_size)
+
+        trace = get_trace(rcv, idx)
+        self.writer.append(data, seq=getattr(rcv, "last_seq", None), timestamp=trace.capture_time)
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def record(args, output):
     if args.interactive:
+        # Every sample is the newest frame, frames that arrived while waiting for the user are skipped.
+        rcv = get_receiver(args, latest_only=True)
         idx = 0
         while 1:
             os.system("clear")
@@ -44,16 +97,25 @@ def main():
 
             print("Capturing ...")
             for i in tqdm(range(args.n_sample)):
-                rcv = ZmqSubscriber(args.address, args.channel)
                 data = rcv.get_data()
-                np.save(os.path.join(args.outdir, f"{idx}.npy"), data)
+                output.save(idx, data, rcv)
                 idx += 1
+            output.flush()
         return
 
-    rcv = ZmqSubscriber(args.address, args.channel)
+    rcv = get_receiver(args)
     for idx in tqdm(range(args.n_sample)):
         data = rcv.get_data()
-        np.save(os.path.join(args.outdir, f"{idx}.npy"), data)
+        output.save(idx, data, rcv)
+
+def main():
+    args = get_arguments()
+
+    output = SessionOutput(args.outdir, args) if args.session else DirectoryOutput(args.outdir)
+    try:
+        record(args, output)
+    finally:
+        output.close()
 
 if __name__ == "__main__":
     main()
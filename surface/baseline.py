@@ -6,7 +6,7 @@ class NaiveBaseline:
         self.baseline = None
         self.buf = None
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
         if self.baseline is None:
             if self.buf is None:
                 self.idx = 0
@@ -20,6 +20,46 @@ class NaiveBaseline:
                 del self.buf
                 del self.idx
             else:
-                return np.zeros(x.shape, dtype=x.dtype)
+                if out is None:
+                    return np.zeros(x.shape, dtype=x.dtype)
+                out.fill(0)
+                return out
         
-        return x - self.baseline
+        return np.subtract(x, self.baseline, out=out)
+
+class DriftTrackingBaseline(NaiveBaseline):
+    """
+    Starts from the average of the first n_samples frames and then follows slow drift (temperature, humidity)
+    with an exponential moving average. Pixels marked in the exclusion mask (occupied or recently triggered
+    fields) and pixels that differ from the baseline by more than max_delta are not updated, so pieces and
+    hands are not absorbed into the baseline.
+    """
+    def __init__(self, n_samples, alpha=0.002, max_delta=5.0):
+        super().__init__(n_samples)
+        self.alpha = alpha
+        self.max_delta = max_delta
+        self.exclusion_mask = None
+        self.update = None
+
+    def set_exclusion_mask(self, mask):
+        self.exclusion_mask = mask
+
+    def __call__(self, x, out=None):
+        if self.baseline is None:
+            return super().__call__(x, out)
+
+        c_diff = np.subtract(x, self.baseline, out=out)
+
+        if self.update is None:
+            self.update = np.empty(x.shape, dtype=self.baseline.dtype)
+            self.update_mask = np.empty(x.shape, dtype=bool)
+
+        np.abs(c_diff, out=self.update)
+        np.less_equal(self.update, self.max_delta, out=self.update_mask)
+        if self.exclusion_mask is not None:
+            np.copyto(self.update_mask, False, where=self.exclusion_mask)
+
+        np.multiply(c_diff, self.alpha, out=self.update)
+        np.add(self.baseline, self.update, out=self.baseline, where=self.update_mask)
+
+        return c_diff
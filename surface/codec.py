@@ -0,0 +1,159 @@
+import struct
+from .game_types import *
+
+# Every message starts with a version byte followed by a type tag. All integers are little endian.
+VERSION = 1
+
+TAG_NONE = 0
+TAG_BOOL = 1
+TAG_PIECE = 2
+TAG_MOVE = 3
+TAG_OVERRIDE = 4
+TAG_SUMMARY = 5
+TAG_FIELD = 6
+TAG_BOARD = 7
+TAG_COMMAND = 8
+
+COMMANDS = ("move", "override", "end_game", "update_busy_flag")
+
+NO_VALUE = 0xFF
+
+# Enum values are contiguous and start at 0, so members can be looked up by indexing.
+_PLAYERS = tuple(PlayerType)
+_PIECE_TYPES = tuple(PieceType)
+_MOVE_TYPES = tuple(MoveType)
+_POINT_TYPES = tuple(PointType)
+
+_TAG = struct.Struct("<B")
+_PIECE = struct.Struct("<BB")
+_MOVE = struct.Struct("<BBBBB")
+_OVERRIDE = struct.Struct("<BBi")
+_SUMMARY = struct.Struct("<iiii?BBB")
+_FIELD = struct.Struct("<BBBBBB")
+_BOARD = struct.Struct("<H")
+
+def _pack_piece(piece):
+    if piece is None:
+        return NO_VALUE, NO_VALUE
+    return piece.player.value, piece.piece_type.value
+
+def _unpack_piece(player, piece_type):
+    if player == NO_VALUE:
+        return None
+    return Piece(_PLAYERS[player], _PIECE_TYPES[piece_type])
+
+def _field_values(field):
+    return (field.level, field.angle) + _pack_piece(field.piece) + _pack_piece(field.last_piece_in_round)
+
+def _field_from_values(level, angle, player, piece_type, last_player, last_piece_type):
+    field = PhotosynthesisField(level, angle, _unpack_piece(player, piece_type))
+    if last_player != NO_VALUE:
+        field.last_piece_in_round = _unpack_piece(last_player, last_piece_type)
+
+    return field
+
+def _encode_value(obj):
+    if obj is None:
+        return _TAG.pack(TAG_NONE)
+
+    if isinstance(obj, bool):
+        return _TAG.pack(TAG_BOOL) + struct.pack("<?", obj)
+
+    if isinstance(obj, Piece):
+        return _TAG.pack(TAG_PIECE) + _PIECE.pack(*_pack_piece(obj))
+
+    if isinstance(obj, Move):
+        return _TAG.pack(TAG_MOVE) + _MOVE.pack(*_pack_piece(obj.piece), obj.move_type.value,
+                                                obj.coordinates[0], obj.coordinates[1])
+
+    if isinstance(obj, Override):
+        return _TAG.pack(TAG_OVERRIDE) + _OVERRIDE.pack(obj.player.value, obj.points_type.value, obj.score_delta)
+
+    if isinstance(obj, GameStateSummary):
+        return _TAG.pack(TAG_SUMMARY) + _SUMMARY.pack(obj.winter_sun_points, obj.winter_score,
+                                                      obj.autumn_sun_points, obj.autumn_score,
+                                                      obj.game_busy, obj.center_next_reward,
+                                                      obj.fertile_next_reward, obj.edge_next_reward)
+
+    if isinstance(obj, PhotosynthesisField):
+        return _TAG.pack(TAG_FIELD) + _FIELD.pack(*_field_values(obj))
+
+    if isinstance(obj, list) and len(obj) > 0 and all(isinstance(x, PhotosynthesisField) for x in obj):
+        values = []
+        for field in obj:
+            values += _field_values(field)
+
+        return _TAG.pack(TAG_BOARD) + _BOARD.pack(len(obj)) + bytes(values)
+
+    if isinstance(obj, dict) and obj.get("cmd") in COMMANDS and set(obj.keys()) <= {"cmd", "data"}:
+        return _TAG.pack(TAG_COMMAND) + _TAG.pack(COMMANDS.index(obj["cmd"])) + _encode_value(obj.get("data"))
+
+    raise TypeError(f"Objects of type {type(obj).__name__} can't be encoded")
+
+def _decode_value(buf, offset):
+    tag = buf[offset]
+    offset += 1
+
+    if tag == TAG_NONE:
+        return None, offset
+
+    if tag == TAG_BOOL:
+        return bool(buf[offset]), offset + 1
+
+    if tag == TAG_PIECE:
+        return _unpack_piece(*_PIECE.unpack_from(buf, offset)), offset + _PIECE.size
+
+    if tag == TAG_MOVE:
+        player, piece_type, move_type, level, angle = _MOVE.unpack_from(buf, offset)
+        move = Move(_unpack_piece(player, piece_type), _MOVE_TYPES[move_type], (level, angle))
+        return move, offset + _MOVE.size
+
+    if tag == TAG_OVERRIDE:
+        player, points_type, score_delta = _OVERRIDE.unpack_from(buf, offset)
+        return Override(_PLAYERS[player], _POINT_TYPES[points_type], score_delta), offset + _OVERRIDE.size
+
+    if tag == TAG_SUMMARY:
+        return GameStateSummary(*_SUMMARY.unpack_from(buf, offset)), offset + _SUMMARY.size
+
+    if tag == TAG_FIELD:
+        return _field_from_values(*_FIELD.unpack_from(buf, offset)), offset + _FIELD.size
+
+    if tag == TAG_BOARD:
+        n_fields, = _BOARD.unpack_from(buf, offset)
+        offset += _BOARD.size
+
+        values = bytes(buf[offset:offset + n_fields*_FIELD.size])
+        fields = [_field_from_values(*values[i:i + _FIELD.size]) for i in range(0, len(values), _FIELD.size)]
+
+        return fields, offset + len(values)
+
+    if tag == TAG_COMMAND:
+        cmd = COMMANDS[buf[offset]]
+        data, offset = _decode_value(buf, offset + 1)
+
+        packet = {"cmd": cmd}
+        if data is not None:
+            packet["data"] = data
+
+        return packet, offset
+
+    raise ValueError(f"Unknown type tag {tag}")
+
+def encode(obj):
+    """
+    Encodes game types (and supervisor command dictionaries) into bytes. Raises TypeError for anything else,
+    including values that don't fit the binary format (e.g. negative coordinates), so that callers fall back
+    to pickle.
+    """
+    try:
+        return _TAG.pack(VERSION) + _encode_value(obj)
+    except (struct.error, ValueError) as e:
+        raise TypeError(f"{type(obj).__name__} can't be encoded: {e}") from e
+
+def decode(buf):
+    version = buf[0]
+    if version != VERSION:
+        raise ValueError(f"Unsupported message version {version}, expected {VERSION}")
+
+    obj, _ = _decode_value(buf, 1)
+    return obj
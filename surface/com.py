@@ -1,22 +1,145 @@
 import zmq
+import pickle
+import struct
+import numpy as np
+from . import codec
+from .tracing import Trace
+
+# Message layout: [channel, header, *payload]. Header starts with a kind byte and a sequence number,
+# arrays are followed by one (dtype, shape) descriptor each and sent as raw buffers. Game types are
+# sent in the binary layout from surface.codec and everything else is pickled. When a message carries a
+# trace it is appended as the last frame.
+KIND_ARRAY = b"a"
+KIND_LIST = b"l"
+KIND_TUPLE = b"t"
+KIND_CODEC = b"g"
+KIND_PICKLE = b"p"
+
+FLAG_TRACE = 1
+
+_HEADER = struct.Struct("<cqBB")
+
+def _is_plain_array(obj):
+    return isinstance(obj, np.ndarray) and obj.ndim > 0 and not obj.dtype.hasobject
+
+def _encode_array_descriptor(arr):
+    dtype = arr.dtype.str.encode("ascii")
+    return struct.pack(f"<B{len(dtype)}sB{arr.ndim}I", len(dtype), dtype, arr.ndim, *arr.shape)
+
+def _decode_array_descriptor(header, offset):
+    dtype_len = header[offset]
+    dtype = header[offset + 1:offset + 1 + dtype_len].decode("ascii")
+    offset += 1 + dtype_len
+
+    ndim = header[offset]
+    shape = struct.unpack_from(f"<{ndim}I", header, offset + 1)
+    offset += 1 + 4*ndim
+
+    return np.dtype(dtype), shape, offset
+
+def encode_message(obj, seq=0, trace=None):
+    frames = _encode_payload(obj, seq, 0 if trace is None else FLAG_TRACE)
+    if trace is not None:
+        frames.append(trace.encode())
+
+    return frames
+
+def _encode_payload(obj, seq, flags):
+    if _is_plain_array(obj):
+        kind, arrays = KIND_ARRAY, [obj]
+    elif isinstance(obj, (list, tuple)) and len(obj) > 0 and all(_is_plain_array(x) for x in obj):
+        kind, arrays = (KIND_LIST if isinstance(obj, list) else KIND_TUPLE), obj
+    else:
+        try:
+            return [_HEADER.pack(KIND_CODEC, seq, 0, flags), codec.encode(obj)]
+        except TypeError:
+            return [_HEADER.pack(KIND_PICKLE, seq, 0, flags), pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)]
+
+    arrays = [np.ascontiguousarray(arr) for arr in arrays]
+    header = _HEADER.pack(kind, seq, len(arrays), flags) + b"".join(_encode_array_descriptor(arr) for arr in arrays)
+
+    return [header] + [arr.reshape(-1).view(np.uint8) for arr in arrays]
+
+def decode_message(frames):
+    """
+    Returns (object, sequence number, trace or None).
+    """
+    header = bytes(frames[0])
+    kind, seq, n_arrays, flags = _HEADER.unpack_from(header)
+    trace = Trace.decode(frames[-1]) if flags & FLAG_TRACE else None
+
+    if kind == KIND_CODEC:
+        return codec.decode(frames[1]), seq, trace
+
+    if kind == KIND_PICKLE:
+        return pickle.loads(frames[1]), seq, trace
+
+    arrays = []
+    offset = _HEADER.size
+    for buf in frames[1:1 + n_arrays]:
+        dtype, shape, offset = _decode_array_descriptor(header, offset)
+        arrays.append(np.frombuffer(buf, dtype=dtype).reshape(shape))
+
+    if kind == KIND_ARRAY:
+        return arrays[0], seq, trace
+    if kind == KIND_TUPLE:
+        return tuple(arrays), seq, trace
+
+    return arrays, seq, trace
 
 class ZmqSubscriber:
-    def __init__(self, address="tcp://localhost:5555", channel="default"):
+    def __init__(self, address="tcp://localhost:5555", channel="default", latest_only=False, hwm=None):
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.SUB)
+        if hwm is not None:
+            self.socket.setsockopt(zmq.RCVHWM, hwm)
         self.socket.connect(address)
         self.socket.setsockopt(zmq.SUBSCRIBE, channel.encode("ascii"))
+        self.last_seq = None
+        self.last_trace = None
+
+        # In latest only mode all queued messages except the newest one are skipped.
+        self.latest_only = latest_only
+        self.n_skipped = 0
+
+    def _receive_latest(self):
+        frames = self.socket.recv_multipart(copy=False)
+        while 1:
+            try:
+                frames = self.socket.recv_multipart(zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                return frames
+
+            self.n_skipped += 1
 
     def get_data(self):
-        self.socket.recv_string()
-        return self.socket.recv_pyobj()
+        """
+        Arrays are returned as views of the received message buffers, no copy is made.
+        """
+        if self.latest_only:
+            frames = self._receive_latest()
+        else:
+            frames = self.socket.recv_multipart(copy=False)
+
+        obj, self.last_seq, self.last_trace = decode_message([frame.buffer for frame in frames[1:]])
+        return obj
 
 class ZmqPublisher:
     def __init__(self, address="tcp://*:5555"):
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.PUB)
         self.socket.bind(address)
+        self.seq = 0
+
+    def send_data(self, obj, channel="default", seq=None, copy=False, trace=None):
+        """
+        Arrays (and lists or tuples of arrays) are sent without serialization, everything else is pickled.
+        Unless copy is set, sent arrays are referenced by zmq until delivered and must not be modified.
+        Optional trace is delivered to subscribers as last_trace.
+        """
+        if seq is None:
+            seq = self.seq
+        self.seq = seq + 1
 
-    def send_data(self, obj, channel="default"):
-        self.socket.send_string(channel, zmq.SNDMORE)
-        self.socket.send_pyobj(obj)
+        frames = [channel.encode("ascii")] + encode_message(obj, seq, trace)
+        self.socket.send_multipart(frames, copy=copy)
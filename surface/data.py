@@ -1,19 +1,26 @@
 import glob
 import os
-import cv2
 import json
+import shutil
+import hashlib
 import numpy as np
 from pathlib import Path
 from .misc import align
+from .session import SessionReader, is_session
 from .baseline import NaiveBaseline
-from .game_board import crop_images_from_fields
+from .field_sampler import FieldSampler
 
-def load_samples(path, extension="*.npy"):
-    samples = []
+def list_samples(path, extension="*.npy"):
     filepaths = list(glob.glob(os.path.join(path, extension)))
-    filepaths = sorted(filepaths, key=lambda x: int(os.path.basename(x).split(".")[0]))
+    return sorted(filepaths, key=lambda x: int(os.path.basename(x).split(".")[0]))
+
+def load_samples(path, extension="*.npy"):
+    # Session files are memory mapped, frames are read from disk when they are accessed.
+    if is_session(path):
+        return list(SessionReader(path))
 
-    for filepath in filepaths:
+    samples = []
+    for filepath in list_samples(path, extension):
         samples.append(np.load(filepath))
 
     return samples
@@ -40,6 +47,24 @@ def _get_classes_and_filenames(dataroot, extension="*.npy"):
 def list_directories(path):
     return [f.path for f in os.scandir(path) if f.is_dir() ]
 
+def find_recordings(root):
+    """
+    Returns all recordings under root: directories with .npy files and session files.
+    """
+    if is_session(root):
+        return [root]
+
+    recordings = []
+    for path in list_directories(root):
+        recordings += find_recordings(path)
+
+    names = os.listdir(root)
+    if any(name.endswith(".npy") for name in names):
+        recordings.append(root)
+    recordings += [os.path.join(root, name) for name in names if is_session(os.path.join(root, name))]
+
+    return recordings
+
 def load_json(filepath):
     with open(filepath) as f:
         return json.load(f)
@@ -95,13 +120,12 @@ def get_samples_from_field(path, fields, n_baseline, target_size):
 
     samples = samples[n_baseline:]
 
+    sampler = FieldSampler(fields, target_size)
+
     negative_samples = []
     positive_samples = []
     for sample in samples:
-        for i, cropped_img in enumerate(crop_images_from_fields(fields, sample)):
-            if cropped_img.shape[0] != target_size[0] or cropped_img.shape[1] != target_size[1]:
-                cropped_img = cv2.resize(cropped_img, target_size, interpolation=cv2.INTER_AREA)
-
+        for i, cropped_img in enumerate(sampler(sample)):
             field = fields[i]
             if field.level in levels and field.angle in angles:
                 positive_samples.append(cropped_img)
@@ -126,7 +150,14 @@ def load_class(path, fields, n_baseline, target_size):
 
     return negative_samples, positive_samples
 
-def load_dataset(dataroot, fields, n_baseline=5, target_size=(16, 16)):
+# Bump when preprocessing changes so that old cached datasets are not used.
+DATASET_CACHE_VERSION = 1
+
+def extract_samples(dataroot, fields, n_baseline=5, target_size=(16, 16)):
+    """
+    Preprocesses all recordings of the dataset. Returns classes, positive samples with their labels, all
+    negative samples and number of positive samples of the last class.
+    """
     classes, class_paths, class_idx = get_classes_pieces(dataroot)
 
     if len(classes) == 0:
@@ -135,7 +166,7 @@ def load_dataset(dataroot, fields, n_baseline=5, target_size=(16, 16)):
     X = []
     Y = []
     negative_samples = []
-    number_of_samples_per_class = None
+    n_samples_per_class = None
     for cls_idx, cls_path in zip(class_idx, class_paths):
         neg_samples, pos_samples = load_class(cls_path, fields, n_baseline, target_size)
 
@@ -145,9 +176,77 @@ def load_dataset(dataroot, fields, n_baseline=5, target_size=(16, 16)):
         Y += [cls_idx] * n_samples_per_class
         negative_samples += neg_samples
 
+    return classes, np.array(X), np.array(Y), np.array(negative_samples), n_samples_per_class
+
+def get_dataset_cache_key(dataroot, fields, n_baseline, target_size):
+    """
+    Hash of everything preprocessed samples depend on: dataset files with their sizes and modification times,
+    preprocessing parameters and geometry of the fields.
+    """
+    files = []
+    for root, _, names in os.walk(dataroot):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            files.append((os.path.relpath(os.path.join(root, name), dataroot), stat.st_size, stat.st_mtime_ns))
+
+    key = {
+        "version": DATASET_CACHE_VERSION,
+        "files": sorted(files),
+        "n_baseline": n_baseline,
+        "target_size": list(target_size),
+        "fields": [[field.level, field.angle] + field.coords.tolist() for field in fields]
+    }
+
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()
+
+def load_cached_samples(dataroot, fields, n_baseline, target_size, cache_dir):
+    """
+    extract_samples with the results stored in cache_dir. Cached arrays are memory mapped.
+    """
+    path = os.path.join(cache_dir, get_dataset_cache_key(dataroot, fields, n_baseline, target_size))
+
+    if not os.path.exists(path):
+        classes, X, Y, negative_samples, n_samples_per_class = extract_samples(dataroot, fields, n_baseline,
+                                                                               target_size)
+
+        # Written to a temporary directory first so that an interrupted run does not leave a broken cache.
+        tmp_path = path + f".tmp{os.getpid()}"
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "X.npy"), X)
+        np.save(os.path.join(tmp_path, "Y.npy"), Y)
+        np.save(os.path.join(tmp_path, "negative_samples.npy"), negative_samples)
+        np.save(os.path.join(tmp_path, "negative_activation.npy"), np.sum(np.abs(negative_samples), axis=(1,2)))
+        with open(os.path.join(tmp_path, "classes.json"), "w") as f:
+            json.dump({"classes": classes, "n_samples_per_class": n_samples_per_class}, f)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another run cached the same dataset in the meantime, its arrays are the same.
+            shutil.rmtree(tmp_path)
+            if not os.path.exists(path):
+                raise
+
+    meta = load_json(os.path.join(path, "classes.json"))
+    arrays = [np.load(os.path.join(path, name), mmap_mode="r")
+              for name in ("X.npy", "Y.npy", "negative_samples.npy", "negative_activation.npy")]
+
+    return (meta["classes"], *arrays, meta["n_samples_per_class"])
+
+def load_dataset(dataroot, fields, n_baseline=5, target_size=(16, 16), cache_dir=None):
+    """
+    Returns classes (with "empty" class appended), samples and labels. Positive samples are all fields with
+    a piece, negative samples are drawn at random from all the other fields. When cache_dir is set, preprocessed
+    samples are stored there and only the drawing of negative samples is repeated.
+    """
+    if cache_dir is None:
+        classes, X, Y, negative_samples, n_samples_per_class = extract_samples(dataroot, fields, n_baseline,
+                                                                               target_size)
+        train_neg_activation = np.sum(np.abs(negative_samples), axis=(1,2))
+    else:
+        classes, X, Y, negative_samples, train_neg_activation, n_samples_per_class = \
+            load_cached_samples(dataroot, fields, n_baseline, target_size, cache_dir)
+
     # Stratified sample negative samples.
-    negative_samples = np.array(negative_samples)
-    train_neg_activation = np.sum(np.abs(negative_samples), axis=(1,2))
     train_neg_activation_threshold = train_neg_activation.mean() + train_neg_activation.mean()*0.2
 
     indexes_fragments = np.where(train_neg_activation > train_neg_activation_threshold)[0]
@@ -159,8 +258,6 @@ def load_dataset(dataroot, fields, n_baseline=5, target_size=(16, 16)):
     sampled_negatives = np.append(negative_samples[rand_index_fragments],
                                   negative_samples[rand_index_noise], axis=0)
 
-    X, Y = np.array(X), np.array(Y)
-
     X = np.append(X, sampled_negatives, axis=0)
     Y = np.append(Y, np.ones(sampled_negatives.shape[0], dtype=np.int32)*len(classes))
 
@@ -0,0 +1,226 @@
+import cv2
+import numpy as np
+from .touch_surface import WIDTH, HEIGHT
+
+def resize_matrix(src_size, target_size):
+    """
+    Returns matrix M such that M @ img.flatten() equals cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
+    for any image of size src_size. Area resampling is linear so M is found by resizing every basis image.
+    """
+    n_pixels = src_size[0]*src_size[1]
+    matrix = np.empty((target_size[0]*target_size[1], n_pixels), dtype=np.float64)
+
+    basis = np.zeros(n_pixels, dtype=np.float64)
+    for i in range(n_pixels):
+        basis[i] = 1.0
+        matrix[:, i] = cv2.resize(basis.reshape(src_size), target_size, interpolation=cv2.INTER_AREA).flatten()
+        basis[i] = 0.0
+
+    return matrix
+
+def _index_image(frame_shape, roi):
+    """
+    Image with the index of every pixel in the flattened frame, or in the compacted frame when roi is given.
+    Cropping it gives indices of pixels of a field.
+    """
+    if roi is None:
+        return np.arange(frame_shape[0]*frame_shape[1]).reshape(frame_shape)
+    return roi.lookup.reshape(frame_shape)
+
+class FieldROI:
+    """
+    Pixels covered by at least one field. Frames compacted to the vector of these pixels can be processed
+    by all operators in this module (built with the same roi) while the rest of the surface is skipped.
+    """
+    def __init__(self, fields, frame_shape=(HEIGHT, WIDTH)):
+        self.frame_shape = tuple(frame_shape)
+
+        mask = np.zeros(frame_shape, dtype=bool)
+        for field in fields:
+            field.crop_image(mask)[:] = True
+
+        self.indices = np.flatnonzero(mask)
+        self.size = len(self.indices)
+
+        # Position of every frame pixel in the compacted frame (-1 outside of roi).
+        self.lookup = np.full(mask.size, -1, dtype=np.int64)
+        self.lookup[self.indices] = np.arange(self.size)
+
+        # Aligning rolls rows of the frame, pixels are gathered from a frame with every row repeated twice
+        # so the roll is a plain shift of indices.
+        width = frame_shape[1]
+        self.doubled_indices = (self.indices // width)*2*width + self.indices % width + width
+        self.shifted = np.empty(self.size, dtype=np.intp)
+        self.doubled = None
+        self.gathered = None
+
+    def compact(self, frame, out=None):
+        if out is None:
+            return frame.reshape(-1)[self.indices]
+
+        out[:] = frame.reshape(-1)[self.indices]
+        return out
+
+    def compact_aligned(self, img, out, min_loc_offset=0):
+        """
+        Same as compact(align(img, min_loc_offset)) but only roi pixels are moved, result is written into out.
+        """
+        width = img.shape[1]
+        offset = (min_loc_offset - int(np.argmin(img[-1]))) % width
+
+        if self.doubled is None or self.doubled.dtype != img.dtype:
+            self.doubled = np.empty((img.shape[0], 2*width), dtype=img.dtype)
+            self.gathered = np.empty(self.size, dtype=img.dtype)
+
+        self.doubled[:, :width] = img
+        self.doubled[:, width:] = img
+
+        # Aligned pixel (row, col) comes from (row, col - offset). Indices are always valid, take with mode="clip"
+        # writes directly into out instead of a temporary copy.
+        np.subtract(self.doubled_indices, offset, out=self.shifted)
+        np.take(self.doubled.reshape(-1), self.shifted, out=self.gathered, mode="clip")
+        np.copyto(out, self.gathered, casting="unsafe")
+        return out
+
+    def expand(self, values, out=None, fill=0):
+        """
+        Returns full frame with values at roi pixels, e.g. for display.
+        """
+        if out is None:
+            out = np.full(self.frame_shape, fill, dtype=values.dtype)
+
+        out.reshape(-1)[self.indices] = values
+        return out
+
+class FieldSampler:
+    """
+    Crops all fields from a frame and resizes them to target_size (the same as crop_images_from_fields followed
+    by normalize_size). Fields are grouped by size, each group is a single gather and a single matrix product.
+    With roi the sampler takes compacted frames.
+    """
+    def __init__(self, fields, target_size=(16, 16), frame_shape=(HEIGHT, WIDTH), roi=None):
+        self.n_fields = len(fields)
+        self.target_size = tuple(target_size)
+        self.frame_shape = tuple(frame_shape)
+
+        index_img = _index_image(frame_shape, roi)
+        crops = [field.crop_image(index_img) for field in fields]
+
+        self.groups = []
+        for size in sorted(set(crop.shape for crop in crops)):
+            positions = np.array([i for i, crop in enumerate(crops) if crop.shape == size])
+            indices = np.stack([crops[i].flatten() for i in positions])
+
+            if size == self.target_size:
+                matrix = None
+            else:
+                matrix = resize_matrix(size, self.target_size).T.astype(np.float32)
+
+            self.groups.append((positions, indices, matrix))
+
+    def __call__(self, frame, out=None):
+        """
+        Returns (n_fields, target height, target width) float32 array.
+        """
+        if out is None:
+            out = np.empty((self.n_fields,) + self.target_size, dtype=np.float32)
+
+        flat_frame = frame.reshape(-1)
+        flat_out = out.reshape(self.n_fields, -1)
+        for positions, indices, matrix in self.groups:
+            pixels = flat_frame[indices]
+            if matrix is None:
+                flat_out[positions] = pixels
+            else:
+                flat_out[positions] = np.dot(pixels.astype(np.float32, copy=False), matrix)
+
+        return out
+
+class PaddedFieldCropper:
+    """
+    Crops all fields from a frame into one (n_fields, max height, max width) array. Smaller fields are placed
+    in the upper left corner and padded with zeros, n_pixels holds the number of pixels of every field.
+    With roi the cropper takes compacted frames.
+    """
+    def __init__(self, fields, frame_shape=(HEIGHT, WIDTH), dtype=np.float32, roi=None):
+        index_img = _index_image(frame_shape, roi)
+        crops = [field.crop_image(index_img) for field in fields]
+
+        self.frame_shape = tuple(frame_shape)
+        self.crop_shapes = [crop.shape for crop in crops]
+        self.shape = (len(fields), max(crop.shape[0] for crop in crops), max(crop.shape[1] for crop in crops))
+        self.n_pixels = np.array([crop.size for crop in crops])
+
+        # Positions in the flattened output and matching pixel indices in the flattened frame.
+        positions_img = np.arange(np.prod(self.shape)).reshape(self.shape)
+        self.positions = np.concatenate([positions_img[i, :crop.shape[0], :crop.shape[1]].flatten()
+                                         for i, crop in enumerate(crops)])
+        self.indices = np.concatenate([crop.flatten() for crop in crops])
+
+        self.dtype = dtype
+
+    def __call__(self, frame, out=None):
+        if out is None:
+            out = np.zeros(self.shape, dtype=self.dtype)
+
+        # Padding is never written so it stays zero when out is reused.
+        out.reshape(-1)[self.positions] = frame.reshape(-1)[self.indices]
+        return out
+
+    def unpad(self, padded):
+        """
+        Returns list of field images (views into padded) with their original sizes.
+        """
+        return [img[:shape[0], :shape[1]] for img, shape in zip(padded, self.crop_shapes)]
+
+class FieldActivityMap:
+    """
+    Activation of every field: sum of absolute values of its pixels divided by (height + width). All sums are
+    read from a single summed-area table of the frame. With roi the map takes compacted frames and sums
+    pixels of every field directly instead, a summed-area table needs the full frame.
+    """
+    def __init__(self, fields, frame_shape=(HEIGHT, WIDTH), roi=None):
+        self.frame_shape = tuple(frame_shape)
+        self.roi = roi
+
+        if roi is not None:
+            crops = [field.crop_image(_index_image(frame_shape, roi)) for field in fields]
+            self.indices = np.concatenate([crop.flatten() for crop in crops])
+            self.starts = np.cumsum([0] + [crop.size for crop in crops[:-1]])
+            self.gathered = np.empty(len(self.indices), dtype=np.float32)
+
+        self.abs_frame = np.empty(frame_shape, dtype=np.float32)
+        self.sat = np.zeros((frame_shape[0] + 1, frame_shape[1] + 1), dtype=np.float64)
+
+        # Field crop covers rows y0:y1 and columns x0:x1, clipped to the frame the same way as slicing does.
+        y0 = np.array([np.clip(field.coords[1][0], 0, frame_shape[0]) for field in fields])
+        x0 = np.array([np.clip(field.coords[1][1], 0, frame_shape[1]) for field in fields])
+        y1 = np.array([np.clip(field.coords[2][0], 0, frame_shape[0]) for field in fields])
+        x1 = np.array([np.clip(field.coords[2][1], 0, frame_shape[1]) for field in fields])
+
+        stride = frame_shape[1] + 1
+        self.corners = np.stack([y1*stride + x1, y0*stride + x0, y0*stride + x1, y1*stride + x0])
+        self.norm = (y1 - y0) + (x1 - x0)
+
+        self.activity = np.zeros(len(fields), dtype=np.float64)
+
+    def __call__(self, frame):
+        """
+        Returns activation of every field. The returned array is reused by the next call.
+        """
+        if self.roi is not None:
+            np.take(frame, self.indices, out=self.gathered, mode="clip")
+            np.abs(self.gathered, out=self.gathered)
+            np.add.reduceat(self.gathered, self.starts, out=self.activity, dtype=np.float64)
+            self.activity /= self.norm
+            return self.activity
+
+        np.abs(frame, out=self.abs_frame, casting="unsafe")
+        cv2.integral(self.abs_frame, self.sat, sdepth=cv2.CV_64F)
+
+        flat = self.sat.reshape(-1)
+        np.subtract(flat[self.corners[0]] + flat[self.corners[1]], flat[self.corners[2]] + flat[self.corners[3]],
+                    out=self.activity)
+        self.activity /= self.norm
+
+        return self.activity
@@ -464,6 +464,14 @@ class PhotosynthesisGame:
         self.autumn_player.sun_points = 0
         self.winter_player.sun_points = 0
 
+def summarize_game(game, is_busy):
+    return GameStateSummary(game.winter_player.sun_points, game.winter_player.score,
+                            game.autumn_player.sun_points, game.autumn_player.score,
+                            is_busy,
+                            REWARDS_CENTER[game.trees_cut_center_count],
+                            REWARDS_FERTILE[game.trees_cut_fertile_count],
+                            REWARDS_EDGE[game.trees_cut_edge_count])
+
 def piece_from_store_position(angle):
     if angle >= 0 and angle <= 3:
         return PieceType["seed"]
@@ -477,13 +485,20 @@ def piece_from_store_position(angle):
     return PieceType["large"]
 
 class VotingBoardStateEstimator:
-    def __init__(self, n_fields, n_votes=3):
+    def __init__(self, n_fields, n_votes=3, commit_margin=None):
         self.state_estimate = np.zeros(n_fields, dtype=np.uint8)
         self.n_votes_casted = np.zeros(n_fields, dtype=np.int8) - 1
         self.votes = np.zeros((n_fields, n_votes), dtype=np.uint8)
         self.n_votes = n_votes
 
-    def update_state(self, model_predictions):
+        # Predictions with margin of at least commit_margin change the state immediately, without voting.
+        self.commit_margin = commit_margin
+        self.committed = np.zeros(n_fields, dtype=bool)
+
+    def update_state(self, model_predictions, margins=None):
+        # 0. If margins are given, a prediction that differs from the state estimate and has margin of at least
+        #    commit_margin is saved to self.state_estimate right away and ends voting of the field. These fields
+        #    are marked in self.committed.
         # 1. Each field can be in the voting state or not.
         # 2. Voting is triggered by change in the prediction from the model.
         # 2. If field is in the voting state the predictions will be saved to votes.
@@ -491,7 +506,16 @@ class VotingBoardStateEstimator:
         # 4. The most frequent answer is saved to self.state_estimate. If we can't find the most frequent answer we do not update the field.
         # 5. Whether field is in the voting state or not is indicated by self.vote_count. If vote count is set to -1 then voting is not performed.
         # If this number is higher than -1 voting is beeing performed.
+        self.committed[:] = False
+        if margins is not None and self.commit_margin is not None:
+            self.committed[:] = (model_predictions != self.state_estimate) & (margins >= self.commit_margin)
+            self.state_estimate[self.committed] = model_predictions[self.committed]
+            self.n_votes_casted[self.committed] = -1
+
         for i, pred in enumerate(model_predictions):
+            if self.committed[i]:
+                continue
+
             if self.n_votes_casted[i] == -1:
                 if pred != self.state_estimate[i]:
                     self.n_votes_casted[i] = 0
@@ -0,0 +1,84 @@
+import numpy as np
+from time import perf_counter
+
+class StageProfiler:
+    """
+    Measures time spent in every stage of frame processing. start() is called when a frame starts, lap(stage)
+    after every stage (time since the previous lap is added to the stage) and end_frame() when the frame is done.
+    Per frame times of the last window frames are kept for percentiles.
+    """
+    def __init__(self, window=500):
+        self.window = window
+        self.times = {}
+        self.frame_times = {}
+        self.frame_ends = np.zeros(window)
+        self.n_frames = 0
+        self.last = perf_counter()
+
+    def start(self):
+        self.frame_times.clear()
+        self.last = perf_counter()
+
+    def lap(self, stage):
+        now = perf_counter()
+        self.frame_times[stage] = self.frame_times.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def end_frame(self):
+        row = self.n_frames % self.window
+        for stage in self.frame_times:
+            if stage not in self.times:
+                self.times[stage] = np.zeros(self.window)
+
+        for stage, times in self.times.items():
+            times[row] = self.frame_times.get(stage, 0.0)
+
+        self.frame_ends[row] = self.last
+        self.n_frames += 1
+
+    def summary(self, percentiles=(50, 95)):
+        """
+        Returns {"fps": ..., "n_frames": ..., "stages": {stage: {"p50": ..., "p95": ..., "max": ...}}}, times
+        are in seconds.
+        """
+        n = min(self.n_frames, self.window)
+        if n == 0:
+            return {"fps": 0.0, "n_frames": 0, "stages": {}}
+
+        ends = self.frame_ends[:n]
+        duration = ends.max() - ends.min()
+        fps = (n - 1)/duration if duration > 0 else 0.0
+
+        stages = {}
+        for stage, times in self.times.items():
+            values = np.percentile(times[:n], percentiles)
+            stages[stage] = {f"p{p}": float(v) for p, v in zip(percentiles, values)}
+            stages[stage]["max"] = float(times[:n].max())
+
+        return {"fps": fps, "n_frames": self.n_frames, "stages": stages}
+
+    def __str__(self):
+        summary = self.summary()
+        rows = [f"fps: {summary['fps']:.2f}"]
+        for stage, values in summary["stages"].items():
+            rows.append(f"  {stage:<12}" + "".join(f"{name} {v*1e3:>8.3f} ms  " for name, v in values.items()))
+
+        return "\n".join(rows)
+
+class NullProfiler:
+    """
+    Used when timing is switched off, all calls do nothing.
+    """
+    def start(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def summary(self, percentiles=(50, 95)):
+        return None
+
+NULL_PROFILER = NullProfiler()
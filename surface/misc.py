@@ -1,4 +1,6 @@
+import os
 import cv2
+import time
 import numpy as np
 from . import touch_surface
 
@@ -32,6 +34,17 @@ def align(img, min_loc_offset=0):
     offset = -(np.argmin(img, axis=1)[-1]) + min_loc_offset
     return np.roll(img, offset, axis=1)
 
+def align_into(img, out, min_loc_offset=0):
+    """
+    Same as align but the result is written into out (two slice copies instead of np.roll).
+    """
+    width = img.shape[1]
+    offset = (min_loc_offset - int(np.argmin(img[-1]))) % width
+
+    out[:, offset:] = img[:, :width - offset]
+    out[:, :offset] = img[:, width - offset:]
+    return out
+
 def pos_neg_sep(x):
    positive = np.copy(x)
    negative = np.copy(x)
@@ -44,3 +57,12 @@ def pos_neg_sep(x):
 
 def norm(x):
    return ((x-np.min(x))/(np.max(x)-np.min(x)) )* 255.
+
+def create_move_log(log_file):
+    if not os.path.exists(log_file):
+        with open(log_file, "w") as f:
+            f.write("time, move_type, piece_type, player, level, angle\n")
+
+def log_move(log_file, move):
+    with open(log_file, "a") as f:
+        f.write(f"{int(time.time())}, {move.move_type.name},{move.piece.piece_type.name},{move.piece.player.name},{move.coordinates[0]}, {move.coordinates[1]}\n")
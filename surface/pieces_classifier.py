@@ -1,10 +1,44 @@
 import os
-import joblib
 import numpy as np
 from .misc import normalize_size
+from .svm import SvcInference, ARTIFACT_NAME, save_artifact, load_artifact, ovo_vote, ovo_margins
+
+BACKENDS = ("sklearn", "numpy")
+
+def load_classes(path):
+    """
+    Returns class names of the model in path, from the model artifact when there is one.
+    """
+    artifact_filepath = os.path.join(path, ARTIFACT_NAME)
+    if os.path.exists(artifact_filepath):
+        return load_artifact(artifact_filepath)[1]
+
+    import joblib
+    return np.array(joblib.load(os.path.join(path, "classes.bin")))
 
 class PiecesClassifier:
-    def __init__(self, path):
+    """
+    With backend="numpy" the SVC is evaluated by SvcInference (scaler included) instead of sklearn. The model
+    is then loaded from model.npz if the directory has one, without importing sklearn, and from the joblib
+    files otherwise.
+    """
+    def __init__(self, path, backend="sklearn"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}!")
+        self.backend = backend
+
+        self.scaler = None
+        self.model = None
+        self.svm = None
+
+        artifact_filepath = os.path.join(path, ARTIFACT_NAME)
+        if backend == "numpy" and os.path.exists(artifact_filepath):
+            self.svm, self.classes, self.target_img_size = load_artifact(artifact_filepath)
+            return
+
+        # Unpickling the model imports sklearn.
+        import joblib
+
         scaler_filepath = os.path.join(path, "scaler.bin")
         model_filepath = os.path.join(path, "model.bin")
         classes_filepath = os.path.join(path, "classes.bin")
@@ -14,15 +48,120 @@ class PiecesClassifier:
         self.model = joblib.load(model_filepath)
         self.classes = np.array(joblib.load(classes_filepath))
         self.target_img_size = joblib.load(target_img_size_filepath)
+        if backend == "numpy":
+            self.svm = SvcInference.from_sklearn(self.model, self.scaler)
+        else:
+            # Margins are computed from one-vs-one decisions, predict is not affected.
+            self.model.decision_function_shape = "ovo"
+            n_classes = len(self.model.classes_)
+            self.pair_first = np.array([i for i in range(n_classes) for j in range(i + 1, n_classes)])
+            self.pair_second = np.array([j for i in range(n_classes) for j in range(i + 1, n_classes)])
+
+    def save_artifact(self, path):
+        """
+        Saves the model into a model artifact (see surface.svm.save_artifact).
+        """
+        svm = self.svm or SvcInference.from_sklearn(self.model, self.scaler)
+        save_artifact(path, svm, self.classes, self.target_img_size)
     
-    def _preprocess_data(self, imgs):
-        imgs = normalize_size(imgs, self.target_img_size)
+    def preprocess(self, imgs):
+        """
+        Resizes images and scales them into features for the model (numpy backend scales them itself).
+        """
+        # Images from FieldSampler already have the target size.
+        is_resized = isinstance(imgs, np.ndarray) and imgs.ndim == 3 and \
+                     imgs.shape[1] == self.target_img_size[0] and imgs.shape[2] == self.target_img_size[1]
+        if not is_resized:
+            imgs = normalize_size(imgs, self.target_img_size)
         imgs = imgs.reshape((-1, imgs.shape[1]*imgs.shape[2]))
+        if self.svm is not None:
+            return imgs
         imgs = self.scaler.transform(imgs)
         return imgs
 
+    def predict(self, features):
+        if self.svm is not None:
+            return self.svm.predict(features)
+        return self.model.predict(features)
+
+    def predict_with_margin(self, features):
+        """
+        Returns predictions and their margins, the smallest one-vs-one decision between the predicted class and
+        the other classes (see surface.svm.ovo_margins).
+        """
+        if self.svm is not None:
+            return self.svm.predict_with_margin(features)
+
+        # Predictions are voted from the same decisions so that the kernel is evaluated only once.
+        decisions = self.model.decision_function(features)
+        # Binary decision is positive for the second class, one-vs-one decisions favour the first class of the pair.
+        if decisions.ndim == 1:
+            decisions = -decisions[:, None]
+        idx = ovo_vote(decisions, self.pair_first, self.pair_second, len(self.model.classes_))
+
+        return self.model.classes_[idx], ovo_margins(decisions, idx, self.pair_first, self.pair_second)
+
     def forward(self, imgs):
-        imgs = self._preprocess_data(imgs)
-        preds = self.model.predict(imgs)
+        return self.predict(self.preprocess(imgs))
+
+class CascadeClassifier:
+    """
+    Two stage classifier: cheap gate model (empty vs occupied, e.g. trained with --binary_classifier) runs on
+    all images and the model runs only on images the gate predicts occupied, the others are empty. Has the same
+    interface and classes as the model.
+    """
+    def __init__(self, gate, model):
+        if list(gate.target_img_size) != list(model.target_img_size):
+            raise ValueError("Gate and model must use the same image size!")
+
+        self.gate = gate
+        self.model = model
+        self.classes = model.classes
+        self.target_img_size = model.target_img_size
+
+        self.idx_gate_empty = list(gate.classes).index("empty")
+        self.idx_empty = list(model.classes).index("empty")
+
+        # Fraction of images that passed the gate.
+        self.n_images = 0
+        self.n_passed = 0
+
+    def preprocess(self, imgs):
+        """
+        Only resizes images, both models scale them with their own scalers.
+        """
+        if isinstance(imgs, np.ndarray) and imgs.ndim == 3 and tuple(imgs.shape[1:]) == tuple(self.target_img_size):
+            return imgs
+        return normalize_size(imgs, self.target_img_size)
+
+    def predict_with_margin(self, imgs):
+        """
+        Fields the gate predicts empty get the margin of the gate, the other ones the margin of the model.
+        """
+        preds = np.full(len(imgs), self.idx_empty, dtype=np.int64)
+
+        gate_preds, margins = self.gate.predict_with_margin(self.gate.preprocess(imgs))
+        idx = np.flatnonzero(gate_preds != self.idx_gate_empty)
+        if len(idx) > 0:
+            preds[idx], margins[idx] = self.model.predict_with_margin(self.model.preprocess(imgs[idx]))
+
+        self.n_images += len(imgs)
+        self.n_passed += len(idx)
+
+        return preds, margins
+
+    def predict(self, imgs):
+        preds = np.full(len(imgs), self.idx_empty, dtype=np.int64)
+
+        gate_preds = self.gate.predict(self.gate.preprocess(imgs))
+        idx = np.flatnonzero(gate_preds != self.idx_gate_empty)
+        if len(idx) > 0:
+            preds[idx] = self.model.predict(self.model.preprocess(imgs[idx]))
+
+        self.n_images += len(imgs)
+        self.n_passed += len(idx)
 
         return preds
+
+    def forward(self, imgs):
+        return self.predict(self.preprocess(imgs))
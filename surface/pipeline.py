@@ -0,0 +1,111 @@
+import time
+import queue
+import threading
+import traceback
+
+# Returned by a source stage when there are no more items. It is passed through the queues after all items
+# queued before it and every stage that gets it forwards it and exits.
+END_OF_STREAM = object()
+
+def put_latest(q, item):
+    """
+    Puts item into a bounded queue, dropping the oldest queued item when the queue is full.
+    Returns True if something was dropped.
+    """
+    dropped = False
+    while 1:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                q.get_nowait()
+                dropped = True
+            except queue.Empty:
+                pass
+
+class Stage:
+    """
+    Runs fn in its own thread. Source stages (without input queue) call fn() in a loop, other stages call
+    fn(item) for every item taken from the input queue. Results other than None are put into the output queue.
+    """
+    def __init__(self, name, fn, input_queue=None, output_queue=None, drop_oldest=False):
+        self.name = name
+        self.fn = fn
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.drop_oldest = drop_oldest
+
+        self.n_processed = 0
+        self.n_dropped = 0
+
+    def _put(self, item):
+        if self.drop_oldest:
+            self.n_dropped += put_latest(self.output_queue, item)
+        else:
+            self.output_queue.put(item)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            if self.input_queue is None:
+                out = self.fn()
+            else:
+                item = self.input_queue.get()
+                out = END_OF_STREAM if item is END_OF_STREAM else self.fn(item)
+
+            if out is END_OF_STREAM:
+                if self.output_queue is not None:
+                    self.output_queue.put(END_OF_STREAM)
+                return
+
+            self.n_processed += 1
+            if out is not None and self.output_queue is not None:
+                self._put(out)
+
+    def start(self, stop_event):
+        self.stop_event = stop_event
+
+        def wrapper():
+            try:
+                self._run()
+            except Exception:
+                print(f"Stage {self.name} failed:")
+                traceback.print_exc()
+                # One failed stage stops the whole pipeline.
+                stop_event.set()
+
+        self.thread = threading.Thread(target=wrapper, name=self.name, daemon=True)
+        self.thread.start()
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = stages
+        self.stop_event = threading.Event()
+
+    def print_status(self, status_fn=None):
+        print(", ".join(f"{stage.name}: {stage.n_processed} processed, {stage.n_dropped} dropped"
+                        for stage in self.stages))
+        if status_fn is not None:
+            print(status_fn())
+
+    def run(self, status_interval=None, status_fn=None):
+        """
+        Runs until END_OF_STREAM went through all stages with an input queue (they are joined, so everything
+        queued before it is processed) or until one of the stages stops the pipeline. Stage counters (and
+        status_fn() if set) are printed every status_interval seconds.
+        """
+        for stage in self.stages:
+            stage.start(self.stop_event)
+        consumers = [stage for stage in self.stages if stage.input_queue is not None]
+
+        last_status = time.time()
+        while not self.stop_event.wait(0.1):
+            if not any(stage.thread.is_alive() for stage in consumers):
+                for stage in consumers:
+                    stage.thread.join()
+                self.print_status(status_fn)
+                return
+
+            if status_interval is not None and time.time() - last_status >= status_interval:
+                last_status = time.time()
+                self.print_status(status_fn)
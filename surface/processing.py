@@ -0,0 +1,441 @@
+import copy
+import time
+import numpy as np
+from .baseline import NaiveBaseline
+from .misc import align_into
+from .touch_surface import WIDTH, HEIGHT
+from .metrics import NULL_PROFILER
+from .game_board import PHOTOSYNTHESIS_FIELDS, VotingBoardStateEstimator, crop_images_from_fields
+from .field_sampler import FieldSampler, PaddedFieldCropper, FieldActivityMap
+
+N_SUN_FIELDS = 6
+N_WARMUP_FRAMES = 5
+
+def check_if_good_signal(imgs, n_pixels=None, min_n_pixel_active_threshold=0.06, pixel_active_threshold=5,
+                         min_n_active_pixel_negative_threshold=0.3):
+    """
+    imgs is (N, h, w) array of field images. Images of smaller fields can be zero padded, in that case n_pixels
+    holds the number of pixels of every field.
+    """
+    if n_pixels is None:
+        n_pixels = imgs.shape[1]*imgs.shape[2]
+
+    active = np.abs(imgs) > pixel_active_threshold
+    n_above_threshold = active.sum(axis=(1, 2))
+    n_negative_active = (active & (imgs < 0)).sum(axis=(1, 2))
+
+    good_above_threshold = n_above_threshold > (n_pixels*min_n_pixel_active_threshold)
+    good_negative_above_threshold = n_negative_active > (n_above_threshold*min_n_active_pixel_negative_threshold)
+
+    return good_above_threshold & good_negative_above_threshold
+
+def filter_preds(preds, is_good, idx_empty):
+    return np.where(is_good, preds, idx_empty)
+
+def find_trigger(activity, threshold=12.0, n_vote=4):
+    """
+    activity is activation of every field (FieldActivityMap of the frame difference).
+    """
+    is_triggered = activity > threshold
+    return np.where(is_triggered, n_vote, 0), int(is_triggered.sum())
+
+def gate_predictions(preds, state, trigger):
+    # Prediction is accepted only in the frame in which the trigger counter of the field runs out.
+    return np.where(trigger == 1, preds, state)
+
+class ClassificationStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.n_frames = 0
+        self.n_fields = 0
+        self.n_classified = 0
+        self.classify_time = 0.0
+
+        # Time of classifications of all fields at once, reference for the time saved.
+        self.n_full_fields = 0
+        self.full_classify_time = 0.0
+
+    @property
+    def classifications_per_frame(self):
+        if self.n_frames == 0:
+            return 0.0
+        return self.n_classified/self.n_frames
+
+    @property
+    def saved_time(self):
+        """
+        Estimate of classifier time saved compared to classification of all fields in every frame.
+        """
+        if self.n_full_fields == 0:
+            return 0.0
+        return self.full_classify_time/self.n_full_fields*self.n_fields - self.classify_time
+
+    def __str__(self):
+        skipped = 1 - self.n_classified/self.n_fields if self.n_fields else 0.0
+        return (f"classifications per frame: {self.classifications_per_frame:.1f}, skipped: {skipped*100:.1f} %, "
+                f"classifier time: {self.classify_time*1e3:.1f} ms, saved (estimate): {self.saved_time*1e3:.1f} ms")
+
+def classify(model, imgs, profiler=NULL_PROFILER, with_margin=False):
+    """
+    Returns predictions of the model for imgs (and their margins if with_margin is set), the model is not called
+    when there are no images.
+    """
+    if len(imgs) == 0:
+        preds = np.zeros(0, dtype=np.int64)
+        return (preds, np.zeros(0)) if with_margin else preds
+
+    features = model.preprocess(imgs)
+    profiler.lap("preprocess")
+    out = model.predict_with_margin(features) if with_margin else model.predict(features)
+    profiler.lap("predict")
+
+    return out
+
+class CachedFieldClassifier:
+    """
+    Keeps the last prediction of every field and selects fields that have to be classified: fields with good
+    signal that were not classified yet, that are active (activity above activity_threshold) or whose state is
+    being voted on. Fields without good signal are empty anyway so they are skipped. All fields are classified
+    every refresh_interval frames.
+    With event_driven=False every field is classified in every frame.
+    """
+    def __init__(self, n_fields, idx_empty, event_driven=True, activity_threshold=3.0, refresh_interval=50,
+                 stats=None):
+        self.idx_empty = idx_empty
+        self.event_driven = event_driven
+        self.activity_threshold = activity_threshold
+        self.refresh_interval = refresh_interval
+        self.stats = stats or ClassificationStats()
+
+        self.preds = np.full(n_fields, idx_empty, dtype=np.int64)
+        self.margins = np.zeros(n_fields)
+        self.is_valid = np.zeros(n_fields, dtype=bool)
+        self.n_frames_since_refresh = refresh_interval
+        self.is_full = False
+
+    def select(self, is_good, activity, is_voting):
+        """
+        Returns indices of fields that have to be classified in this frame, their predictions are passed to update.
+        """
+        self.is_full = not self.event_driven or self.n_frames_since_refresh >= self.refresh_interval
+        if self.is_full:
+            to_classify = np.ones(len(self.preds), dtype=bool)
+            self.n_frames_since_refresh = 0
+        else:
+            to_classify = is_good & (~self.is_valid | (activity > self.activity_threshold) | is_voting)
+        self.n_frames_since_refresh += 1
+
+        return np.flatnonzero(to_classify)
+
+    def update(self, idx, preds, is_good, margins=None):
+        """
+        Stores predictions (and margins) of fields idx and returns predictions of all fields filtered by is_good
+        (the same as filter_preds of predictions of all fields).
+        """
+        if len(idx) > 0:
+            self.preds[idx] = preds
+            if margins is not None:
+                self.margins[idx] = margins
+        self.is_valid[:] = is_good
+
+        self.stats.n_classified += len(idx)
+        self.stats.n_fields += len(self.preds)
+        if self.is_full:
+            self.stats.n_full_fields += len(idx)
+
+        return filter_preds(self.preds, is_good, self.idx_empty)
+
+    def filtered_margins(self, is_good):
+        """
+        Margins of the predictions returned by update. Fields without good signal are empty because of the filter,
+        not because of the model, so their margin is 0.
+        """
+        return np.where(is_good, self.margins, 0.0)
+
+class FramePreprocessor:
+    """
+    Aligns the frame, cancels the baseline and computes difference to the previous frame without allocating
+    anything per frame. c_diff of the current and of the previous frame are kept in two alternating buffers,
+    so returned c_diff stays valid until the next call but one and c_diff_dt until the next call.
+    With roi all outputs are compacted frames (see FieldROI).
+    """
+    def __init__(self, baseline_processor, frame_shape=(HEIGHT, WIDTH), min_loc_offset=-1, roi=None,
+                 profiler=NULL_PROFILER):
+        self.baseline_processor = baseline_processor
+        self.profiler = profiler
+        self.min_loc_offset = min_loc_offset
+        self.roi = roi
+
+        shape = tuple(frame_shape) if roi is None else (roi.size,)
+        self.aligned = np.empty(shape, dtype=np.float32)
+        self.c_diff_buffers = np.zeros((2,) + shape, dtype=np.float32)
+        self.c_diff_dt = np.empty(shape, dtype=np.float32)
+        self.idx = 0
+
+    def __call__(self, x):
+        """
+        Returns (c_diff, c_diff_dt).
+        """
+        if self.roi is None:
+            align_into(x, self.aligned, self.min_loc_offset)
+        else:
+            self.roi.compact_aligned(x, self.aligned, self.min_loc_offset)
+        self.profiler.lap("align")
+
+        self.idx ^= 1
+        c_diff = self.baseline_processor(self.aligned, out=self.c_diff_buffers[self.idx])
+        np.subtract(c_diff, self.c_diff_buffers[self.idx ^ 1], out=self.c_diff_dt)
+        self.profiler.lap("baseline")
+
+        return c_diff, self.c_diff_dt
+
+class FrameProcessor:
+    """
+    Turns raw frames into gated board and sun state predictions. The first n_avg_baseline frames are used
+    for the baseline and the next N_WARMUP_FRAMES only fill the voting state estimators, process returns
+    None for all of them.
+    """
+    def __init__(self, pieces_model, sun_model, n_avg_baseline, fields=PHOTOSYNTHESIS_FIELDS, baseline_processor=None,
+                 roi=None, event_driven=False, refresh_interval=50, commit_margin=None, profiler=NULL_PROFILER):
+        self.pieces_model = pieces_model
+        self.sun_model = sun_model
+        self.fields = fields
+        self.n_avg_baseline = n_avg_baseline
+        self.roi = roi
+        self.profiler = profiler
+
+        self.board_sampler = FieldSampler(fields[:-N_SUN_FIELDS], pieces_model.target_img_size, roi=roi)
+        self.sun_sampler = FieldSampler(fields[-N_SUN_FIELDS:], sun_model.target_img_size, roi=roi)
+        self.cropper = PaddedFieldCropper(fields, roi=roi)
+        self.padded_images = np.zeros(self.cropper.shape, dtype=np.float32)
+
+        # Activation of every field in the last frame difference, other stages can reuse it.
+        self.activity_map = FieldActivityMap(fields, roi=roi)
+        self.activity = None
+
+        # Field of every pixel in cropper.indices, used to mask pixels of selected fields.
+        self.pixel_field_idx = np.repeat(np.arange(len(fields)), self.cropper.n_pixels)
+        self.excluded_pixels = np.zeros(self.cropper.frame_shape if roi is None else roi.size, dtype=bool)
+        self.excluded_fields = None
+        self.n_frames = 0
+
+        self.baseline_processor = baseline_processor or NaiveBaseline(n_avg_baseline)
+        self.preprocessor = FramePreprocessor(self.baseline_processor, roi=roi, profiler=profiler)
+
+        self.trigger = np.zeros(len(fields), dtype=int)
+        self.board_state = None
+        self.sun_state = None
+
+        # With commit_margin confident predictions of active fields skip voting and gating.
+        self.commit_margin = commit_margin
+        self.state_estimator_board = VotingBoardStateEstimator(len(fields) - N_SUN_FIELDS, commit_margin=commit_margin)
+        self.state_estimator_sun = VotingBoardStateEstimator(N_SUN_FIELDS, commit_margin=commit_margin)
+
+        self.classification_stats = ClassificationStats()
+        self.board_classifier = CachedFieldClassifier(len(fields) - N_SUN_FIELDS, len(pieces_model.classes) - 1,
+                                                      event_driven, refresh_interval=refresh_interval,
+                                                      stats=self.classification_stats)
+        self.sun_classifier = CachedFieldClassifier(N_SUN_FIELDS, 0, event_driven, refresh_interval=refresh_interval,
+                                                    stats=self.classification_stats)
+        self.pending = None
+
+    @property
+    def is_warming_up(self):
+        return self.n_frames < self.n_avg_baseline + N_WARMUP_FRAMES
+
+    def process(self, x):
+        """
+        Returns (c_diff, field_images, (board_state, sun_state)) or None while warming up. c_diff and field images
+        (views of c_diff) are overwritten two frames later, copy them if they are needed for longer. With roi
+        c_diff is compacted, roi.expand turns it back into a frame.
+        """
+        images = self.prepare(x)
+        if images is None:
+            return None
+
+        with_margin = self.commit_margin is not None
+        start = time.perf_counter()
+        preds_board = classify(self.pieces_model, images[0], self.profiler, with_margin)
+        preds_sun = classify(self.sun_model, images[1], self.profiler, with_margin)
+
+        return self.finish(preds_board, preds_sun, time.perf_counter() - start)
+
+    def prepare(self, x):
+        """
+        First half of process: preprocesses the frame and returns (board_images, sun_images) of the fields that
+        have to be classified, or None while the baseline is estimated. Predictions of these images are passed
+        to finish. Models are called in between, so that fields of several processors can share one call.
+        """
+        warming_up = self.is_warming_up
+
+        # Decrement trigger counter.
+        if not warming_up:
+            np.subtract(self.trigger, 1, out=self.trigger, where=self.trigger > 0)
+
+        c_diff, c_diff_dt = self.preprocessor(x)
+        self.n_frames += 1
+
+        if self.n_frames <= self.n_avg_baseline:
+            return None
+
+        padded_images = self.cropper(c_diff, self.padded_images)
+        if self.roi is None:
+            field_images = crop_images_from_fields(self.fields, c_diff)
+        else:
+            field_images = self.cropper.unpad(padded_images)
+
+        self.activity = self.activity_map(c_diff_dt)
+        is_good = check_if_good_signal(padded_images, self.cropper.n_pixels)
+
+        board_images = self.board_sampler(c_diff)
+        sun_images = self.sun_sampler(c_diff)
+        self.profiler.lap("crop")
+
+        idx_board = self.board_classifier.select(is_good[:-N_SUN_FIELDS], self.activity[:-N_SUN_FIELDS],
+                                                 self.state_estimator_board.n_votes_casted != -1)
+        idx_sun = self.sun_classifier.select(is_good[-N_SUN_FIELDS:], self.activity[-N_SUN_FIELDS:],
+                                             self.state_estimator_sun.n_votes_casted != -1)
+
+        self.pending = (warming_up, c_diff, field_images, is_good, idx_board, idx_sun)
+        return board_images[idx_board], sun_images[idx_sun]
+
+    def finish(self, preds_board, preds_sun, classify_time=0.0):
+        """
+        Second half of process: takes predictions of the images returned by prepare and returns the same as process.
+        With commit_margin predictions are (preds, margins) tuples.
+        """
+        warming_up, c_diff, field_images, is_good, idx_board, idx_sun = self.pending
+        self.pending = None
+
+        margins_board, margins_sun = None, None
+        if self.commit_margin is not None:
+            preds_board, margins_board = preds_board
+            preds_sun, margins_sun = preds_sun
+
+        preds_board = self.board_classifier.update(idx_board, preds_board, is_good[:-N_SUN_FIELDS], margins_board)
+        preds_sun = self.sun_classifier.update(idx_sun, preds_sun, is_good[-N_SUN_FIELDS:], margins_sun)
+        if self.commit_margin is not None:
+            margins_board = self.board_classifier.filtered_margins(is_good[:-N_SUN_FIELDS])
+            margins_sun = self.sun_classifier.filtered_margins(is_good[-N_SUN_FIELDS:])
+
+        self.classification_stats.n_frames += 1
+        self.classification_stats.classify_time += classify_time
+        if self.board_classifier.is_full:
+            self.classification_stats.full_classify_time += classify_time
+
+        self.state_estimator_board.update_state(preds_board, margins_board)
+        self.state_estimator_sun.update_state(preds_sun, margins_sun)
+        self.profiler.lap("voting")
+
+        if warming_up:
+            self._update_baseline_exclusion()
+            return None
+
+        preds_board = self.state_estimator_board.state_estimate
+        preds_sun = self.state_estimator_sun.state_estimate
+
+        if self.board_state is None:
+            self.board_state = copy.deepcopy(preds_board)
+            self.sun_state = copy.deepcopy(preds_sun)
+
+        self.board_state = gate_predictions(preds_board, self.board_state, self.trigger[:-N_SUN_FIELDS])
+        self.sun_state = gate_predictions(preds_sun, self.sun_state, self.trigger[-N_SUN_FIELDS:])
+
+        new_trigger, how_many_triggered = find_trigger(self.activity)
+
+        # Too many fields changed at once, most likely the board was touched by hand.
+        if how_many_triggered <= 3:
+            # Fields committed early are active now, they don't have to wait for the trigger.
+            if self.commit_margin is not None:
+                self.board_state = np.where(self.state_estimator_board.committed & (new_trigger[:-N_SUN_FIELDS] > 0),
+                                            preds_board, self.board_state)
+                self.sun_state = np.where(self.state_estimator_sun.committed & (new_trigger[-N_SUN_FIELDS:] > 0),
+                                          preds_sun, self.sun_state)
+
+            # Update trigger state.
+            np.copyto(self.trigger, new_trigger, where=new_trigger > 0)
+
+        self._update_baseline_exclusion()
+        self.profiler.lap("gating")
+
+        return c_diff, field_images, (self.board_state, self.sun_state)
+
+    def _update_baseline_exclusion(self):
+        """
+        Baselines that track drift must not learn occupied fields and fields that are changing right now.
+        """
+        if not hasattr(self.baseline_processor, "set_exclusion_mask"):
+            return
+
+        is_excluded = self.trigger > 0
+        is_excluded[:-N_SUN_FIELDS] |= self.state_estimator_board.state_estimate != len(self.pieces_model.classes) - 1
+        is_excluded[-N_SUN_FIELDS:] |= self.state_estimator_sun.state_estimate != 0
+
+        # Mask changes only when a field is occupied, emptied or triggered.
+        if self.excluded_fields is not None and np.array_equal(is_excluded, self.excluded_fields):
+            return
+        self.excluded_fields = is_excluded
+
+        self.excluded_pixels[:] = False
+        self.excluded_pixels.reshape(-1)[self.cropper.indices[is_excluded[self.pixel_field_idx]]] = True
+        self.baseline_processor.set_exclusion_mask(self.excluded_pixels)
+
+def split_predictions(preds, sizes):
+    """
+    Splits predictions (or (preds, margins) tuple) of concatenated images back into parts of the given sizes.
+    """
+    splits = np.cumsum(sizes)[:-1]
+    if isinstance(preds, tuple):
+        return list(zip(*[np.split(x, splits) for x in preds]))
+    return np.split(preds, splits)
+
+class MultiTableProcessor:
+    """
+    Processes frames of several tables with one pair of models. Every table has its own FrameProcessor (baseline,
+    voting and trigger state), fields of all tables are classified with a single call of each model per tick.
+    All processors must use the same commit_margin setting.
+    """
+    def __init__(self, processors, pieces_model, sun_model, profiler=NULL_PROFILER):
+        self.processors = processors
+        self.pieces_model = pieces_model
+        self.sun_model = sun_model
+        self.profiler = profiler
+
+    @property
+    def is_warming_up(self):
+        return any(processor.is_warming_up for processor in self.processors)
+
+    def process(self, frames):
+        """
+        Takes one frame of every table and returns list with output of FrameProcessor.process for every table.
+        Tables without a new frame (None) are skipped and their output is None.
+        """
+        images = [None if x is None else processor.prepare(x) for processor, x in zip(self.processors, frames)]
+        active = [i for i, table_images in enumerate(images) if table_images is not None]
+        outputs = [None]*len(self.processors)
+        if len(active) == 0:
+            return outputs
+
+        board_images = [images[i][0] for i in active]
+        sun_images = [images[i][1] for i in active]
+        n_board = [len(imgs) for imgs in board_images]
+        n_sun = [len(imgs) for imgs in sun_images]
+
+        with_margin = self.processors[0].commit_margin is not None
+        start = time.perf_counter()
+        preds_board = classify(self.pieces_model, np.concatenate(board_images), self.profiler, with_margin)
+        preds_sun = classify(self.sun_model, np.concatenate(sun_images), self.profiler, with_margin)
+        classify_time = time.perf_counter() - start
+
+        preds_board = split_predictions(preds_board, n_board)
+        preds_sun = split_predictions(preds_sun, n_sun)
+
+        # Classification time is shared by tables according to the number of classified fields.
+        n_total = max(sum(n_board) + sum(n_sun), 1)
+        for k, i in enumerate(active):
+            table_time = classify_time*(n_board[k] + n_sun[k])/n_total
+            outputs[i] = self.processors[i].finish(preds_board[k], preds_sun[k], table_time)
+
+        return outputs
@@ -0,0 +1,70 @@
+from .pieces_classifier import PiecesClassifier, CascadeClassifier, BACKENDS
+from .processing import FrameProcessor
+from .baseline import NaiveBaseline, DriftTrackingBaseline
+from .field_sampler import FieldROI
+from .game_board import PHOTOSYNTHESIS_FIELDS
+from .metrics import NULL_PROFILER
+
+def add_processing_arguments(parser):
+    """
+    Adds options of signal processing and of the models shared by all scripts that process frames.
+    """
+    parser.add_argument("--n_avg_baseline", type=int, default=5,
+                        help="Baseline is average of this many samples.")
+
+    parser.add_argument("--baseline", type=str, default="naive", choices=["naive", "drift"],
+                        help="naive baseline is fixed after the first frames, drift baseline keeps following slow "
+                             "changes of the empty fields.")
+
+    parser.add_argument("--baseline_alpha", type=float, default=0.002,
+                        help="Update rate of the drift baseline (per frame).")
+
+    parser.add_argument("--roi", action="store_true",
+                        help="Process only pixels covered by the fields, published c_diff is then a compacted frame "
+                             "(display.py expands it).")
+
+    parser.add_argument("--event_driven", action="store_true",
+                        help="Classify only fields with activity, changing signal quality or voting in progress "
+                             "and reuse cached predictions of the other fields.")
+
+    parser.add_argument("--refresh_interval", type=int, default=50,
+                        help="In event driven mode all fields are classified every this many frames.")
+
+    parser.add_argument("--pieces_model_filepath", type=str, default="models/pieces_model",
+                        help="Path to the directory that stores model for pieces classification.")
+
+    parser.add_argument("--sun_model_filepath", type=str, default="models/sun_model",
+                        help="Path to the directory that stores model for sun classification.")
+
+    parser.add_argument("--gate_model_filepath", type=str,
+                        help="If set, this empty vs occupied model runs first and the pieces model classifies only "
+                             "fields it predicts occupied.")
+
+    parser.add_argument("--classifier_backend", type=str, default="sklearn", choices=BACKENDS,
+                        help="numpy evaluates the SVC with batched NumPy instead of sklearn (same predictions).")
+
+    parser.add_argument("--commit_margin", type=float,
+                        help="If set, a changed field whose prediction has at least this margin is committed at once "
+                             "instead of waiting for the votes (see evaluate_early_commit.py).")
+
+def load_models(args):
+    """
+    Returns pieces model (behind the gate model if there is one) and sun model.
+    """
+    pieces_model = PiecesClassifier(args.pieces_model_filepath, args.classifier_backend)
+    if args.gate_model_filepath:
+        pieces_model = CascadeClassifier(PiecesClassifier(args.gate_model_filepath, args.classifier_backend), pieces_model)
+    sun_model = PiecesClassifier(args.sun_model_filepath, args.classifier_backend)
+
+    return pieces_model, sun_model
+
+def create_processor(args, pieces_model, sun_model, profiler=NULL_PROFILER):
+    if args.baseline == "drift":
+        baseline_processor = DriftTrackingBaseline(args.n_avg_baseline, args.baseline_alpha)
+    else:
+        baseline_processor = NaiveBaseline(args.n_avg_baseline)
+    roi = FieldROI(PHOTOSYNTHESIS_FIELDS) if args.roi else None
+
+    return FrameProcessor(pieces_model, sun_model, args.n_avg_baseline, baseline_processor=baseline_processor,
+                          roi=roi, event_driven=args.event_driven, refresh_interval=args.refresh_interval,
+                          commit_margin=args.commit_margin, profiler=profiler)
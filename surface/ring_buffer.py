@@ -0,0 +1,79 @@
+import time
+import threading
+import numpy as np
+from dataclasses import dataclass
+
+@dataclass
+class Frame:
+    seq: int
+    timestamp: float
+    data: np.ndarray
+
+class FrameRingBuffer:
+    def __init__(self, capacity, shape, dtype=np.ubyte, drop_oldest=True):
+        self.capacity = capacity
+        self.drop_oldest = drop_oldest
+
+        self.frames = np.empty([capacity] + list(shape), dtype=dtype)
+        self.seqs = np.zeros(capacity, dtype=np.int64)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+
+        self.head = 0 # Index of the oldest frame.
+        self.size = 0
+        self.next_seq = 0
+
+        self.n_pushed = 0
+        self.n_dropped = 0
+
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+
+    def put(self, data, timestamp=None):
+        """
+        Copies data into the buffer and returns its sequence number. When the buffer is full either
+        the oldest frame is overwritten or the new frame is discarded, depending on drop_oldest.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            self.n_pushed += 1
+
+            if self.size == self.capacity:
+                self.n_dropped += 1
+                if not self.drop_oldest:
+                    return seq
+
+                self.head = (self.head + 1) % self.capacity
+                self.size -= 1
+
+            idx = (self.head + self.size) % self.capacity
+            self.frames[idx] = data
+            self.seqs[idx] = seq
+            self.timestamps[idx] = timestamp
+            self.size += 1
+
+            self.not_empty.notify()
+
+        return seq
+
+    def get(self, timeout=None):
+        """
+        Removes the oldest frame from the buffer and returns a copy of it or None on timeout.
+        """
+        with self.lock:
+            if not self.not_empty.wait_for(lambda: self.size > 0, timeout):
+                return None
+
+            idx = self.head
+            frame = Frame(int(self.seqs[idx]), float(self.timestamps[idx]), self.frames[idx].copy())
+
+            self.head = (self.head + 1) % self.capacity
+            self.size -= 1
+
+        return frame
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import struct
+import numpy as np
+
+# Session file layout:
+#   file header: magic, format version, length of the JSON header and the JSON header itself (frame shape,
+#                frame dtype and user metadata), padded to 8 bytes.
+#   chunks:      chunk magic, number of frames, per frame index (sequence number, timestamp) and the frames,
+#                padded to 8 bytes.
+# Chunks are only ever appended, so a session that was interrupted can still be read up to its last chunk.
+MAGIC = b"PSSN"
+CHUNK_MAGIC = b"CHNK"
+VERSION = 1
+EXTENSION = ".session"
+
+_FILE_HEADER = struct.Struct("<4sII")
+_CHUNK_HEADER = struct.Struct("<4sIQ")
+INDEX_DTYPE = np.dtype([("seq", "<i8"), ("timestamp", "<f8")])
+
+def _padding(n):
+    return (-n) % 8
+
+def is_session(path):
+    return os.path.isfile(path) and path.endswith(EXTENSION)
+
+def _read_file_header(f):
+    magic, version, header_len = _FILE_HEADER.unpack(f.read(_FILE_HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a session file")
+    if version != VERSION:
+        raise ValueError(f"Unsupported session version {version}, expected {VERSION}")
+
+    header = json.loads(f.read(header_len))
+    data_offset = _FILE_HEADER.size + header_len
+    return header, data_offset + _padding(data_offset)
+
+class SessionWriter:
+    def __init__(self, path, shape, dtype=np.ubyte, metadata=None, chunk_size=256):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+
+        self.index = np.zeros(chunk_size, dtype=INDEX_DTYPE)
+        self.frames = np.empty((chunk_size,) + self.shape, dtype=self.dtype)
+        self.n_buffered = 0
+        self.next_seq = 0
+
+        if os.path.exists(path):
+            self._open_existing(path)
+        else:
+            self.f = open(path, "wb")
+            header = json.dumps({"shape": list(self.shape), "dtype": self.dtype.str,
+                                 "created": time.time(), "metadata": metadata or {}}).encode("utf-8")
+            self.f.write(_FILE_HEADER.pack(MAGIC, VERSION, len(header)) + header)
+            self.f.write(bytes(_padding(_FILE_HEADER.size + len(header))))
+
+    def _open_existing(self, path):
+        with open(path, "rb") as f:
+            header, _ = _read_file_header(f)
+
+        if tuple(header["shape"]) != self.shape or np.dtype(header["dtype"]) != self.dtype:
+            raise ValueError(f"{path} stores frames of shape {header['shape']} and dtype {header['dtype']}")
+
+        reader = SessionReader(path)
+        if len(reader) > 0:
+            self.next_seq = int(reader.seqs[-1]) + 1
+        end = reader.end_offset
+        reader.close()
+
+        # Drop a partially written chunk at the end of the file, if there is one.
+        self.f = open(path, "r+b")
+        self.f.truncate(end)
+        self.f.seek(end)
+
+    def append(self, frame, seq=None, timestamp=None):
+        if seq is None:
+            seq = self.next_seq
+        self.next_seq = seq + 1
+
+        self.index[self.n_buffered] = (seq, time.time() if timestamp is None else timestamp)
+        self.frames[self.n_buffered] = frame
+        self.n_buffered += 1
+
+        if self.n_buffered == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.n_buffered == 0:
+            return
+
+        n = self.n_buffered
+        self.f.write(_CHUNK_HEADER.pack(CHUNK_MAGIC, n, 0))
+        self.f.write(self.index[:n].tobytes())
+        self.f.write(self.frames[:n].tobytes())
+        self.f.write(bytes(_padding(self.frames[:n].nbytes)))
+        self.f.flush()
+
+        self.n_buffered = 0
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+class SessionReader:
+    """
+    Memory maps a session file. Frames are read from disk only when they are accessed.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header, offset = _read_file_header(f)
+
+        self.shape = tuple(header["shape"])
+        self.dtype = np.dtype(header["dtype"])
+        self.metadata = header["metadata"]
+        self.created = header["created"]
+
+        self.mm = np.memmap(path, dtype=np.uint8, mode="r")
+        frame_nbytes = int(np.prod(self.shape))*self.dtype.itemsize
+
+        self.chunks = []
+        indexes = []
+        while offset + _CHUNK_HEADER.size <= len(self.mm):
+            magic, n, _ = _CHUNK_HEADER.unpack_from(self.mm, offset)
+            index_offset = offset + _CHUNK_HEADER.size
+            frames_offset = index_offset + n*INDEX_DTYPE.itemsize
+            end = frames_offset + n*frame_nbytes
+            end += _padding(end)
+
+            # Chunk that was not completely written.
+            if magic != CHUNK_MAGIC or end > len(self.mm):
+                break
+
+            indexes.append(np.ndarray(n, dtype=INDEX_DTYPE, buffer=self.mm, offset=index_offset))
+            self.chunks.append(np.ndarray((n,) + self.shape, dtype=self.dtype, buffer=self.mm, offset=frames_offset))
+            offset = end
+
+        self.end_offset = offset
+        self.chunk_starts = np.cumsum([0] + [len(chunk) for chunk in self.chunks])
+
+        index = np.concatenate(indexes) if indexes else np.zeros(0, dtype=INDEX_DTYPE)
+        self.seqs = index["seq"]
+        self.timestamps = index["timestamp"]
+
+    def __len__(self):
+        return int(self.chunk_starts[-1])
+
+    def _locate(self, idx):
+        chunk_idx = int(np.searchsorted(self.chunk_starts, idx, side="right")) - 1
+        return chunk_idx, idx - int(self.chunk_starts[chunk_idx])
+
+    def __getitem__(self, key):
+        """
+        Integer keys return a view of a single frame. Slices return a view when all frames are in the same
+        chunk and a copy otherwise.
+        """
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return np.stack([self[i] for i in range(start, stop, step)])
+            if start >= stop:
+                return np.empty((0,) + self.shape, dtype=self.dtype)
+
+            first_chunk, first_idx = self._locate(start)
+            last_chunk, last_idx = self._locate(stop - 1)
+            if first_chunk == last_chunk:
+                return self.chunks[first_chunk][first_idx:last_idx + 1]
+
+            parts = [self.chunks[first_chunk][first_idx:]] + self.chunks[first_chunk + 1:last_chunk] + \
+                    [self.chunks[last_chunk][:last_idx + 1]]
+            return np.concatenate(parts)
+
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError("Frame index out of range")
+
+        chunk_idx, idx = self._locate(key)
+        return self.chunks[chunk_idx][idx]
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+
+    def close(self):
+        self.chunks = []
+        del self.mm
@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import numpy as np
+from .tracing import Trace
+from multiprocessing import shared_memory, resource_tracker
+
+# Shared memory layout: header (write count, capacity, height, width, dtype), per slot sequence numbers,
+# per slot capture timestamps and the frames themselves. A slot sequence number of -1 marks a slot that is
+# being written.
+_HEADER_SIZE = 5
+
+def _layout(capacity, shape, dtype):
+    header_nbytes = _HEADER_SIZE*8
+    seqs_offset = header_nbytes
+    timestamps_offset = seqs_offset + capacity*8
+    frames_offset = timestamps_offset + capacity*8
+    size = frames_offset + capacity*int(np.prod(shape))*np.dtype(dtype).itemsize
+
+    return seqs_offset, timestamps_offset, frames_offset, size
+
+class _SharedFrameRing:
+    def _map(self, capacity, shape, dtype):
+        seqs_offset, timestamps_offset, frames_offset, _ = _layout(capacity, shape, dtype)
+        buf = self.shm.buf
+
+        self.header = np.ndarray(_HEADER_SIZE, dtype=np.int64, buffer=buf)
+        self.seqs = np.ndarray(capacity, dtype=np.int64, buffer=buf, offset=seqs_offset)
+        self.timestamps = np.ndarray(capacity, dtype=np.float64, buffer=buf, offset=timestamps_offset)
+        self.frames = np.ndarray([capacity] + list(shape), dtype=dtype, buffer=buf, offset=frames_offset)
+        self.capacity = capacity
+
+    def close(self):
+        del self.header, self.seqs, self.timestamps, self.frames
+        self.shm.close()
+
+class SharedFrameWriter(_SharedFrameRing):
+    def __init__(self, name, shape, dtype=np.ubyte, capacity=16):
+        size = _layout(capacity, shape, dtype)[3]
+
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a writer that did not exit cleanly.
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        self._map(capacity, shape, dtype)
+        self.seqs[:] = -1
+        self.header[:] = (0, capacity, shape[0], shape[1], ord(np.dtype(dtype).char))
+
+    def put(self, data, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+
+        seq = int(self.header[0])
+        idx = seq % self.capacity
+
+        self.seqs[idx] = -1
+        self.frames[idx] = data
+        self.timestamps[idx] = timestamp
+        self.seqs[idx] = seq
+        self.header[0] = seq + 1
+
+        return seq
+
+    def close(self):
+        super().close()
+        self.shm.unlink()
+
+class SharedFrameReader(_SharedFrameRing):
+    """
+    Maps frames published by SharedFrameWriter. Frames are returned as views into shared memory, a view
+    stays valid until the writer wraps around the ring (capacity - 1 frames later).
+    """
+    def __init__(self, name, latest_only=True, poll_interval=0.0005):
+        # Python registers attached segments too and would unlink them when this process exits. Python 3.13 can
+        # skip the registration, older versions register the name with the leading "/" that POSIX needs.
+        if sys.version_info >= (3, 13):
+            self.shm = shared_memory.SharedMemory(name, track=False)
+        else:
+            self.shm = shared_memory.SharedMemory(name)
+            if os.name == "posix":
+                resource_tracker.unregister("/" + self.shm.name, "shared_memory")
+
+        _, capacity, height, width, dtype_char = np.ndarray(_HEADER_SIZE, dtype=np.int64, buffer=self.shm.buf)
+        self._map(int(capacity), (int(height), int(width)), np.dtype(chr(dtype_char)))
+
+        self.latest_only = latest_only
+        self.poll_interval = poll_interval
+        self.last_seq = int(self.header[0]) - 1
+        self.last_timestamp = None
+        self.n_skipped = 0
+
+    @property
+    def last_trace(self):
+        if self.last_timestamp is None:
+            return None
+        return Trace(self.last_seq, self.last_timestamp)
+
+    def has_data(self):
+        """
+        True when get_data returns without waiting.
+        """
+        return int(self.header[0]) - 1 > self.last_seq
+
+    def get_data(self):
+        while 1:
+            n_written = int(self.header[0])
+            if n_written - 1 > self.last_seq:
+                break
+            time.sleep(self.poll_interval)
+
+        if self.latest_only:
+            seq = n_written - 1
+        else:
+            # Frames older than this were already overwritten or may be overwritten right now.
+            seq = max(self.last_seq + 1, n_written - self.capacity + 1)
+
+        self.n_skipped += seq - self.last_seq - 1
+
+        idx = seq % self.capacity
+        if self.seqs[idx] != seq:
+            # Writer lapped us while we were waking up, try again with a newer frame.
+            self.last_seq = seq
+            self.n_skipped += 1
+            return self.get_data()
+
+        self.last_seq = seq
+        self.last_timestamp = float(self.timestamps[idx])
+
+        return self.frames[idx]
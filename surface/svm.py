@@ -0,0 +1,158 @@
+import numpy as np
+
+KERNELS = ("linear", "poly", "rbf", "sigmoid")
+
+# Version of the model artifact written by save_artifact.
+ARTIFACT_VERSION = 1
+ARTIFACT_NAME = "model.npz"
+
+_ARRAYS = ("inv_scale", "offset", "support_vectors_t", "sv_sq_norms", "weights", "intercept", "pair_first",
+           "pair_second", "classes")
+
+class SvcInference:
+    """
+    Predictions of a fitted sklearn SVC (one-vs-one, as SVC.predict) evaluated with batched NumPy. Scaling of
+    the features is part of the model, so it takes raw features. Use from_sklearn to build it from a fitted SVC
+    and StandardScaler.
+    """
+    def __init__(self, kernel, gamma, coef0, degree, inv_scale, offset, support_vectors_t, sv_sq_norms, weights,
+                 intercept, pair_first, pair_second, classes):
+        if kernel not in KERNELS:
+            raise ValueError(f"Unsupported kernel {kernel}!")
+
+        self.kernel = str(kernel)
+        self.gamma = float(gamma)
+        self.coef0 = float(coef0)
+        self.degree = int(degree)
+
+        # Scaling (x - mean)/scale is done as x*inv_scale - offset.
+        self.inv_scale = inv_scale
+        self.offset = offset
+        self.support_vectors_t = support_vectors_t
+        self.sv_sq_norms = sv_sq_norms
+
+        # Decision of pair (pair_first[p], pair_second[p]) is kernel_matrix @ weights[:, p] + intercept[p].
+        self.weights = weights
+        self.intercept = intercept
+        self.pair_first = pair_first
+        self.pair_second = pair_second
+        self.classes = classes
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None, dtype=np.float32):
+        n_features = model.support_vectors_.shape[1]
+        mean = np.zeros(n_features) if scaler is None else scaler.mean_
+        scale = np.ones(n_features) if scaler is None else scaler.scale_
+
+        # For binary problems sklearn flips the sign of the libsvm coefficients, flip it back so that positive
+        # decision of every pair (i, j) is a vote for class i.
+        n_classes = len(model.classes_)
+        dual_coef = model.dual_coef_
+        intercept = model.intercept_
+        if n_classes == 2:
+            dual_coef, intercept = -dual_coef, -intercept
+
+        # Support vectors of every class are stored together, in order of classes.
+        starts = np.concatenate([[0], np.cumsum(model.n_support_)])
+        pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+
+        # Decision of pair (i, j) sums kernels of support vectors of class i weighted by dual_coef[j - 1] and of
+        # class j weighted by dual_coef[i], all pairs are a single matrix product.
+        weights = np.zeros((starts[-1], len(pairs)))
+        for p, (i, j) in enumerate(pairs):
+            weights[starts[i]:starts[i + 1], p] = dual_coef[j - 1, starts[i]:starts[i + 1]]
+            weights[starts[j]:starts[j + 1], p] = dual_coef[i, starts[j]:starts[j + 1]]
+
+        return cls(model.kernel, model._gamma, model.coef0, model.degree,
+                   inv_scale=(1/scale).astype(dtype),
+                   offset=(mean/scale).astype(dtype),
+                   support_vectors_t=np.ascontiguousarray(model.support_vectors_.T, dtype=dtype),
+                   sv_sq_norms=(model.support_vectors_**2).sum(axis=1).astype(dtype),
+                   weights=weights.astype(dtype),
+                   intercept=intercept.astype(dtype),
+                   pair_first=np.array([i for i, _ in pairs]),
+                   pair_second=np.array([j for _, j in pairs]),
+                   classes=np.asarray(model.classes_))
+
+    @property
+    def dtype(self):
+        return self.support_vectors_t.dtype
+
+    def kernel_matrix(self, features):
+        """
+        Kernel between every row of features (unscaled) and every support vector.
+        """
+        x = np.asarray(features, dtype=self.dtype)*self.inv_scale
+        x -= self.offset
+        dot = x @ self.support_vectors_t
+
+        if self.kernel == "linear":
+            return dot
+        if self.kernel == "poly":
+            return (self.gamma*dot + self.coef0)**self.degree
+        if self.kernel == "sigmoid":
+            return np.tanh(self.gamma*dot + self.coef0)
+
+        # ||x - sv||^2 = ||x||^2 + ||sv||^2 - 2 x.sv
+        sq_dist = (x*x).sum(axis=1)[:, None] + self.sv_sq_norms - 2*dot
+        np.maximum(sq_dist, 0, out=sq_dist)
+        return np.exp(-self.gamma*sq_dist)
+
+    def decision_function(self, features):
+        """
+        Returns (n_samples, n_pairs) one-vs-one decisions, positive values are votes for the first class of the pair.
+        """
+        return self.kernel_matrix(features) @ self.weights + self.intercept
+
+    def predict_with_margin(self, features):
+        """
+        Returns predictions and their margins (see ovo_margins).
+        """
+        decisions = self.decision_function(features)
+        idx = ovo_vote(decisions, self.pair_first, self.pair_second, len(self.classes))
+
+        return self.classes[idx], ovo_margins(decisions, idx, self.pair_first, self.pair_second)
+
+    def predict(self, features):
+        decisions = self.decision_function(features)
+        return self.classes[ovo_vote(decisions, self.pair_first, self.pair_second, len(self.classes))]
+
+def ovo_vote(decisions, pair_first, pair_second, n_classes):
+    """
+    Returns index of the class with the most one-vs-one votes for every sample.
+    """
+    winners = np.where(decisions > 0, pair_first, pair_second)
+
+    # Ties are resolved in favour of the class with the lower index, the same as libsvm does.
+    votes = (winners[:, :, None] == np.arange(n_classes)).sum(axis=1)
+    return np.argmax(votes, axis=1)
+
+def ovo_margins(decisions, idx, pair_first, pair_second):
+    """
+    Margin of predicted class idx of every sample: the smallest one-vs-one decision between the predicted class
+    and any other class, oriented so that positive values favour the predicted class. Large margin means the
+    predicted class won all of its pairs by far, margin below zero means it lost some of them.
+    """
+    idx = idx[:, None]
+    oriented = np.where(pair_first == idx, decisions, np.where(pair_second == idx, -decisions, np.inf))
+    return oriented.min(axis=1)
+
+def save_artifact(path, svm, class_names, img_size):
+    """
+    Saves everything PiecesClassifier needs into a single uncompressed .npz file that is loaded without sklearn.
+    """
+    arrays = {name: getattr(svm, name) for name in _ARRAYS}
+    np.savez(path, version=ARTIFACT_VERSION, kernel=svm.kernel, gamma=svm.gamma, coef0=svm.coef0,
+             degree=svm.degree, class_names=np.array(class_names, dtype=str), img_size=np.array(img_size), **arrays)
+
+def load_artifact(path):
+    """
+    Returns (svm, class_names, img_size) saved by save_artifact.
+    """
+    with np.load(path, allow_pickle=False) as f:
+        version = int(f["version"])
+        if version != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported model artifact version {version}, expected {ARTIFACT_VERSION}")
+
+        svm = SvcInference(str(f["kernel"]), f["gamma"], f["coef0"], f["degree"], **{name: f[name] for name in _ARRAYS})
+        return svm, f["class_names"], [int(x) for x in f["img_size"]]
@@ -1,19 +1,62 @@
+import os
+import array
 import numpy as np
 import usb.core
 import usb.util
-import numpy as np
-from .data import load_samples
-from time import sleep
+from time import sleep, perf_counter
+
+from .session import SessionReader, is_session
 
 WIDTH = 240
 HEIGHT = 136
 
+TRANSFER_SIZE = 64
+N_TRANSFERS = (WIDTH*HEIGHT)//TRANSFER_SIZE
+
+# Raw bytes are obfuscated by the controller as ((85 + x) ^ 85) (mod 256), so decoding is a single table lookup.
+DECODE_LUT = ((85 + np.arange(256)) % 256 ^ 85).astype(np.ubyte)
+
+class AcquisitionStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.n_frames = 0
+        self.n_transfers = 0
+        self.n_retries = 0
+        self.frame_time = 0.0
+        self.transfer_time = 0.0
+        self.max_transfer_latency = 0.0
+
+    @property
+    def fps(self):
+        if self.frame_time == 0.0:
+            return 0.0
+        return self.n_frames/self.frame_time
+
+    @property
+    def mean_transfer_latency(self):
+        if self.n_transfers == 0:
+            return 0.0
+        return self.transfer_time/self.n_transfers
+
+    def __str__(self):
+        return (f"fps: {self.fps:.2f}, transfer latency: mean {self.mean_transfer_latency*1e6:.1f} us, "
+                f"max {self.max_transfer_latency*1e6:.1f} us, retries: {self.n_retries}")
+
 class TouchSurface:
     def __init__(self):
         self.send_msg = np.zeros([64,], dtype= np.ubyte)
         self.send_msg[0] = 3
         self.send_msg[1] = 83
 
+        # Every transfer lands in the same 64 byte buffer and is then copied into the frame buffer.
+        self.transfer_buf = array.array("B", bytes(TRANSFER_SIZE))
+        self.transfer_view = np.frombuffer(self.transfer_buf, dtype=np.ubyte)
+        self.frame_buf = np.empty(HEIGHT*WIDTH, dtype=np.ubyte)
+        self.frame = self.frame_buf.reshape(HEIGHT, WIDTH)
+        self.stats = AcquisitionStats()
+
         self.connect()
 
     def connect(self):
@@ -34,40 +77,157 @@ class TouchSurface:
 
         self.dev.ctrl_transfer(bmRequestType=0x21, bRequest=0x09, wValue = 0x303, wIndex=0x00, data_or_wLength=bytes(self.send_msg[:3]), timeout = 1000)
 
+    def _read_transfer(self, n_retries):
+        # Sometimes read randomly fails or returns fewer bytes (the rest of the buffer is then left from the previous
+        # transfer). When it does just retry.
+        for try_n in range(n_retries):
+            try:
+                n_read = self.dev.ctrl_transfer(bmRequestType=0xa1, bRequest=0x01, wValue=0x303, wIndex=0x00, data_or_wLength=self.transfer_buf, timeout=1000)
+            except usb.core.USBTimeoutError as e:
+                self.stats.n_retries += 1
+                if try_n == n_retries-1:
+                    raise e
+                continue
+
+            if n_read == TRANSFER_SIZE:
+                return n_read
+
+            self.stats.n_retries += 1
+            if try_n == n_retries-1:
+                raise usb.core.USBError(f"Short read of {n_read} bytes, expected {TRANSFER_SIZE}")
+
     def read_raw_values(self, n_retries=3):
-        temp = []
-        for i in range(510):
-            # Sometimes read randomly fails. When it does just retry.
-            for try_n in range(n_retries):
-                try:
-                    msg = self.dev.ctrl_transfer(bmRequestType=0xa1, bRequest=0x01, wValue=0x303, wIndex=0x00, data_or_wLength=bytes(self.send_msg), timeout=1000)
-                    temp.append(msg)
-                    break
-                except usb.core.USBTimeoutError as e:
-                    if try_n == n_retries-1:
-                        raise e
-        
-        buffer = np.asarray(temp, dtype=np.ubyte).flatten()
-        raw_view = ((85 + buffer) ^ 85).astype(np.ubyte).reshape(HEIGHT, WIDTH)
-
-        return raw_view
+        """
+        Returns decoded frame. The returned array is reused by the next call, copy it if it has to be kept.
+        """
+        stats = self.stats
+        frame_start = perf_counter()
+
+        for i in range(N_TRANSFERS):
+            transfer_start = perf_counter()
+            self._read_transfer(n_retries)
+            latency = perf_counter() - transfer_start
+
+            stats.transfer_time += latency
+            if latency > stats.max_transfer_latency:
+                stats.max_transfer_latency = latency
+
+            self.frame_buf[i*TRANSFER_SIZE:(i+1)*TRANSFER_SIZE] = self.transfer_view
+
+        np.take(DECODE_LUT, self.frame_buf, out=self.frame_buf)
+
+        stats.n_transfers += N_TRANSFERS
+        stats.n_frames += 1
+        stats.frame_time += perf_counter() - frame_start
+
+        return self.frame
 
     def disconnect(self):
         self.dev.reset()
 
+class EndOfStream(Exception):
+    pass
+
+class ReplayStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.n_frames = 0
+        self.start_time = perf_counter()
+        self.max_lag = 0.0
+
+    @property
+    def fps(self):
+        elapsed = perf_counter() - self.start_time
+        if elapsed == 0.0:
+            return 0.0
+        return self.n_frames/elapsed
+
+    def __str__(self):
+        return f"replayed: {self.n_frames}, fps: {self.fps:.2f}, max lag behind schedule: {self.max_lag*1e3:.1f} ms"
+
 class DummyTouchSurface:
-    def __init__(self, datapath: str, fps=1):
+    """
+    Replays a recording (directory with .npy files or session file), frames are read from disk when needed.
+    Modes:
+     - fps: fixed frame rate,
+     - timed: timing of the original capture sped up speed times,
+     - max: as fast as possible.
+    Raises EndOfStream after the last frame unless loop is set.
+    """
+    MODES = ("fps", "timed", "max")
+
+    def __init__(self, datapath: str, fps=1, mode="fps", speed=1.0, loop=False):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown replay mode {mode}")
+
+        self.mode = mode
         self.delay = 1/fps
-        self.samples = load_samples(datapath)
+        self.speed = speed
+        self.loop = loop
+
+        if is_session(datapath):
+            self.session = SessionReader(datapath)
+            self.n_samples = len(self.session)
+        else:
+            # Imported here, surface.data depends on this module through surface.misc.
+            from .data import list_samples
+
+            self.session = None
+            self.filepaths = list_samples(datapath)
+            self.n_samples = len(self.filepaths)
+
+        if self.n_samples == 0:
+            raise ValueError(f"No samples in {datapath}")
+
+        if mode == "timed":
+            if self.session is not None:
+                timestamps = self.session.timestamps
+            else:
+                # Frames were saved as they arrived so modification time is close to capture time.
+                timestamps = np.array([os.path.getmtime(p) for p in self.filepaths])
+            self.offsets = (timestamps - timestamps[0])/speed
+
         self.idx = 0
-        self.n_samples = len(self.samples)
-    
+        self.stats = ReplayStats()
+        self.schedule_start = None
+
+    def _load(self, idx):
+        if self.session is not None:
+            return self.session[idx]
+        return np.load(self.filepaths[idx])
+
+    def _wait(self):
+        if self.mode == "max":
+            return
+
+        if self.schedule_start is None:
+            self.schedule_start = perf_counter()
+
+        if self.mode == "fps":
+            target = self.schedule_start + (self.idx + 1)*self.delay
+        else:
+            target = self.schedule_start + self.offsets[self.idx]
+
+        now = perf_counter()
+        if target > now:
+            sleep(target - now)
+        else:
+            self.stats.max_lag = max(self.stats.max_lag, now - target)
+
     def get_data(self):
-        sleep(self.delay)
-        sample = self.samples[self.idx]
-       
-        self.idx += 1
         if self.idx == self.n_samples:
+            if not self.loop:
+                raise EndOfStream(f"Replay finished, {self.stats}")
+
             self.idx = 0
+            self.schedule_start = None
+
+        self._wait()
+        sample = self._load(self.idx)
+
+        self.idx += 1
+        self.stats.n_frames += 1
 
         return sample
@@ -0,0 +1,99 @@
+import time
+import struct
+import numpy as np
+from dataclasses import dataclass, field
+
+_TRACE = struct.Struct("<qdB")
+_HOP = struct.Struct("<d")
+
+@dataclass
+class Trace:
+    """
+    Follows a single frame through the processing scripts. Times are wall clock (time.time()) so they can be
+    compared between processes.
+    """
+    frame_id: int
+    capture_time: float
+    hops: list = field(default_factory=list)
+
+    def mark(self, name, t=None):
+        self.hops.append((name, time.time() if t is None else t))
+        return self
+
+    def copy(self):
+        return Trace(self.frame_id, self.capture_time, list(self.hops))
+
+    def latencies(self):
+        """
+        Returns list of (hop name, time since capture, time since previous hop).
+        """
+        out = []
+        last_time = self.capture_time
+        for name, t in self.hops:
+            out.append((name, t - self.capture_time, t - last_time))
+            last_time = t
+
+        return out
+
+    def encode(self):
+        buf = [_TRACE.pack(self.frame_id, self.capture_time, len(self.hops))]
+        for name, t in self.hops:
+            name = name.encode("ascii")
+            buf.append(struct.pack("<B", len(name)) + name + _HOP.pack(t))
+
+        return b"".join(buf)
+
+    @staticmethod
+    def decode(buf):
+        buf = bytes(buf)
+        frame_id, capture_time, n_hops = _TRACE.unpack_from(buf)
+
+        hops = []
+        offset = _TRACE.size
+        for _ in range(n_hops):
+            name_len = buf[offset]
+            name = buf[offset + 1:offset + 1 + name_len].decode("ascii")
+            t, = _HOP.unpack_from(buf, offset + 1 + name_len)
+            hops.append((name, t))
+            offset += 1 + name_len + _HOP.size
+
+        return Trace(frame_id, capture_time, hops)
+
+    def to_dict(self):
+        return {"frame_id": self.frame_id, "capture_time": self.capture_time, "hops": self.hops}
+
+    @staticmethod
+    def from_dict(d):
+        return Trace(d["frame_id"], d["capture_time"], [tuple(hop) for hop in d["hops"]])
+
+def get_trace(receiver, default_frame_id):
+    """
+    Returns a copy of the trace of the last message received by receiver or starts a new trace when the
+    receiver does not provide one (e.g. when data is replayed from a recording).
+    """
+    trace = getattr(receiver, "last_trace", None)
+    if trace is None:
+        return Trace(default_frame_id, time.time())
+
+    return trace.copy()
+
+class LatencyHistogram:
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, trace):
+        for name, since_capture, since_previous in trace.latencies():
+            self.samples.setdefault(name, ([], []))
+            self.samples[name][0].append(since_capture)
+            self.samples[name][1].append(since_previous)
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """
+        Returns {hop name: (n samples, percentiles since capture, percentiles since previous hop)} in seconds.
+        """
+        out = {}
+        for name, (since_capture, since_previous) in self.samples.items():
+            out[name] = (len(since_capture), np.percentile(since_capture, percentiles),
+                         np.percentile(since_previous, percentiles))
+
+        return out
@@ -34,7 +34,8 @@ class ZMQReceiver(QtCore.QObject):
 
     def _execute(self):
         while True:
-            self.dataChanged.emit(self.sub.get_data())
+            data = self.sub.get_data()
+            self.dataChanged.emit((data, self.sub.last_trace))
 
 class App(QWidget):
 
@@ -49,12 +50,13 @@ class App(QWidget):
         zmq_receiver.start(sub)
         self.publisher = pub
         self.ui_clear = True
+        self.current_trace = None
     
     @QtCore.pyqtSlot(object)
     def on_new_move(self, buf):
-        # Put move into the quque
+        # Put move (together with its trace) into the quque
         if self.ui_clear:
-            self.update_ui_state(buf)
+            self.update_ui_state(*buf)
         else:
             self.move_queue.put(buf)
         
@@ -66,6 +68,7 @@ class App(QWidget):
     
     def clear_ui(self):
         self.ui_clear = True
+        self.current_trace = None
 
         self.player_bt_group.setExclusive(False)     
         self.piece_bt_group.setExclusive(False)   
@@ -96,8 +99,9 @@ class App(QWidget):
         self.move_type_bt_group.setExclusive(True)
         self.points_override_type_bt_group.setExclusive(True)
 
-    def update_ui_state(self, move):
+    def update_ui_state(self, move, trace=None):
         self.ui_clear = False
+        self.current_trace = trace
 
         # Player type
         if move.piece.player == PlayerType.autumn:
@@ -325,10 +329,11 @@ class App(QWidget):
         except ValueError as _:
             return
         
-        self.publisher.send_data({"cmd": "move", "data": move}, "commands")
+        trace = self.current_trace.mark("system_supervisor") if self.current_trace is not None else None
+        self.publisher.send_data({"cmd": "move", "data": move}, "commands", trace=trace)
 
         if self.move_queue.qsize() > 0:
-            self.update_ui_state(self.move_queue.get())
+            self.update_ui_state(*self.move_queue.get())
         else:
             self.clear_ui()
 
@@ -339,7 +344,7 @@ class App(QWidget):
 
     def on_reject_move_bt_clicked(self):
         if self.move_queue.qsize() > 0:
-            self.update_ui_state(self.move_queue.get())
+            self.update_ui_state(*self.move_queue.get())
         else:
             self.clear_ui()
         
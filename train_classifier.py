@@ -4,6 +4,7 @@ import joblib
 import argparse
 from surface.data import load_dataset
 from surface.game_board import PHOTOSYNTHESIS_FIELDS
+from surface.svm import SvcInference, ARTIFACT_NAME, save_artifact
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 from sklearn.model_selection import RepeatedKFold, GridSearchCV
 from sklearn.preprocessing import StandardScaler
@@ -17,15 +18,15 @@ def ensure_dir_exists(path):
     if not os.path.exists(path):
         os.makedirs(path)
     
-def load_data(dataset_path, config):
+def load_data(dataset_path, config, cache_dir=None):
     train_dataset_path = os.path.join(dataset_path, "train")
     test_dataset_path = os.path.join(dataset_path, "test")
 
     classes, X_train, Y_train = load_dataset(train_dataset_path, PHOTOSYNTHESIS_FIELDS,
-                                              config["n_baseline"], config["img_size"])
+                                              config["n_baseline"], config["img_size"], cache_dir)
     
     classes, X_test, Y_test = load_dataset(test_dataset_path, PHOTOSYNTHESIS_FIELDS,
-                                           config["n_baseline"], config["img_size"])
+                                           config["n_baseline"], config["img_size"], cache_dir)
     
     return classes, X_train, Y_train, X_test, Y_test
 
@@ -42,6 +43,7 @@ def get_args():
     parser.add_argument('output_model_path', type=str, help='Where model output files will be saved.')
     parser.add_argument('config_path', type=str, help='Path to yaml file containing configuration for the training.')
     parser.add_argument('--binary_classifier', action="store_true", help='When set this merges all classes into a single positive class.')
+    parser.add_argument('--cache_dir', type=str, help='When set preprocessed dataset is cached in this directory and reused while the dataset and preprocessing config do not change.')
 
     return parser.parse_args()
 
@@ -88,13 +90,16 @@ def save_model(path, config, model, classes, scaler):
     joblib.dump(scaler, scaler_filepath)
     joblib.dump(config["img_size"], img_size_filepath)
 
+    # The same model as a single file that the runtime loads without sklearn.
+    save_artifact(os.path.join(path, ARTIFACT_NAME), SvcInference.from_sklearn(model, scaler), classes, config["img_size"])
+
 if __name__ == '__main__':
     args = get_args()
 
     config = load_json(args.config_path)
 
     print("Loading dataset...")
-    classes, X_train, Y_train, X_test, Y_test = load_data(args.dataset_path, config)
+    classes, X_train, Y_train, X_test, Y_test = load_data(args.dataset_path, config, args.cache_dir)
 
     if args.binary_classifier:
         print("Merging all classes into a single positive class...")
@@ -116,4 +121,4 @@ if __name__ == '__main__':
     
     print(f"Saving model to {args.output_model_path}...")
 
-    save_model(args.dataset_path, config, model, classes, scaler)
+    save_model(args.output_model_path, config, model, classes, scaler)